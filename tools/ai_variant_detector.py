@@ -80,12 +80,24 @@ BATCH_SIZE = 50  # Products per batch before saving progress
 MAX_VARIANTS_PER_PRODUCT = 100  # Shopify limit
 MAX_OPTIONS_PER_PRODUCT = 3  # Shopify limit
 
+# Product fields the analysis and apply steps read; catalogue fetches ask for
+# only these so each page of 250 products is a fraction of the full JSON
+PRODUCT_FIELDS = "id,title,handle,vendor,tags,body_html,variants,images"
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Shopify API helpers
 # ─────────────────────────────────────────────────────────────────────────────
 _last_shopify_request = 0
 
+# Keep-alive session carrying the Admin API headers, so each call reuses
+# the connection and doesn't rebuild them
+_SHOPIFY_SESSION = requests.Session()
+_SHOPIFY_SESSION.headers.update({
+    "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
+    "Content-Type": "application/json",
+})
+
 
 def shopify_request(endpoint: str, method: str = "GET", data: dict = None,
                     retries: int = 3) -> dict:
@@ -93,10 +105,6 @@ def shopify_request(endpoint: str, method: str = "GET", data: dict = None,
     global _last_shopify_request
 
     url = f"{SHOPIFY_BASE_URL}/{endpoint}"
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json",
-    }
 
     # Rate limiting
     elapsed = (time.time() * 1000) - _last_shopify_request
@@ -107,11 +115,11 @@ def shopify_request(endpoint: str, method: str = "GET", data: dict = None,
     for attempt in range(1, retries + 1):
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers, timeout=30)
+                resp = _SHOPIFY_SESSION.get(url, timeout=30)
             elif method == "PUT":
-                resp = requests.put(url, headers=headers, json=data, timeout=60)
+                resp = _SHOPIFY_SESSION.put(url, json=data, timeout=60)
             elif method == "POST":
-                resp = requests.post(url, headers=headers, json=data, timeout=60)
+                resp = _SHOPIFY_SESSION.post(url, json=data, timeout=60)
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
@@ -147,7 +155,7 @@ def fetch_all_products(vendor: str = None) -> list:
     last_id = 0
 
     while True:
-        params = ["limit=250"]
+        params = ["limit=250", f"fields={PRODUCT_FIELDS}"]
         if vendor:
             params.append(f"vendor={requests.utils.quote(vendor)}")
         if last_id > 0:
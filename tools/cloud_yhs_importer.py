@@ -20,10 +20,31 @@ import json
 import time
 import base64
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import StringIO
 from pathlib import Path
+from typing import Optional, TextIO, Union
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional: python-calamine reads the spreadsheet much faster than openpyxl
+try:
+    import python_calamine  # pandas reads through it with engine='calamine'
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+# Optional: orjson serializes the PDP and base64 image payloads much faster
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Configuration
 SHOPIFY_STORE = os.environ.get("SHOPIFY_STORE", "oil-slick-pad.myshopify.com")
@@ -35,93 +56,191 @@ VENDOR_NAME = "Cloud YHS"
 SHOPIFY_API_VERSION = "2024-01"
 SHOPIFY_BASE_URL = f"https://{SHOPIFY_STORE}/admin/api/{SHOPIFY_API_VERSION}"
 
+# Products imported concurrently (--workers). Most of each import is waiting
+# on Gemini; Shopify calls are paced by REST_BUCKET and 429s are retried by
+# shopify_request().
+IMPORT_WORKERS = 4
+MAX_THROTTLE_RETRIES = 5
+# The REST call limit is a leaky bucket (40 calls, 2/s; more on Plus stores).
+# Calls only wait once it is this full, then sleep until it has drained to half.
+BUCKET_HIGH_WATER = 0.8
+# Created products, one JSON line per SKU, written as soon as each product
+# exists so an interrupted import can be rerun with --resume without
+# creating duplicates
+CHECKPOINT_FILE = "cloud_yhs_import_checkpoint.jsonl"
+# Source image lookups (local folder or web search), run alongside product creation
+LOOKUP_POOL = ThreadPoolExecutor(max_workers=IMPORT_WORKERS)
+
+# Keep-alive connection pool for Admin API calls. Connection errors and 5xx
+# are retried on idempotent methods only (a retried product POST could
+# duplicate a product).
+SHOPIFY_SESSION = requests.Session()
+SHOPIFY_SESSION.headers.update({
+    "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
+    "Content-Type": "application/json"
+})
+SHOPIFY_SESSION.mount(f"https://{SHOPIFY_STORE}/", HTTPAdapter(
+    pool_maxsize=max(4, IMPORT_WORKERS),
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                      raise_on_status=False)
+))
+
+# Same for Gemini and for the image search/downloads: every product makes
+# the same calls against the same few hosts
+GEMINI_SESSION = requests.Session()
+GEMINI_SESSION.headers.update({
+    "Content-Type": "application/json",
+    "x-goog-api-key": GOOGLE_API_KEY
+})
+GEMINI_SESSION.mount("https://", HTTPAdapter(pool_maxsize=max(4, IMPORT_WORKERS)))
+WEB_SESSION = requests.Session()
+WEB_SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+WEB_SESSION.mount("https://", HTTPAdapter(pool_maxsize=max(4, IMPORT_WORKERS)))
+
 # Gemini API
 GEMINI_MODEL = "gemini-3-pro-image-preview"
 GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
+# Dimensions in the specs column, e.g. 120*40*40mm
+DIM_RE = re.compile(r'(\d+\*\d+(?:\*\d+)?(?:mm)?)')
+# DuckDuckGo search token, as a query param or a quoted JS value
+VQD_RE = re.compile(r'vqd=([^&]+)')
+VQD_QUOTED_RE = re.compile(r"vqd='([^']+)'")
+
+# Keywords that drive materials, tags and product type, found in one pass per
+# string. The lookahead reports overlapping matches too ('clip' inside
+# 'roach clip'); 'glass pipe' shadows 'glass' at the same spot, so
+# _scan_keywords() adds 'glass' back for it.
+KEYWORDS_RE = re.compile(
+    "(?=(water pipe|hand pipe|glass pipe|bubbler|nectar collector|dab tool|roach clip"
+    "|battery|cbd|bong|bowl|ashtray|jar|clip|glass|silicone|plastic|pvc))"
+)
+
+
+def _json_dumps(payload) -> bytes:
+    """Serialize a request payload, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+def _json_loads(content: bytes):
+    """Parse a response body, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class LeakyBucket:
+    """Client-side view of a Shopify leaky bucket, updated from API responses."""
+
+    def __init__(self, capacity: float, leak_rate: float):
+        self.capacity = capacity
+        self.leak_rate = leak_rate  # calls drained per second
+        self.used = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, used: float, capacity: float):
+        """Record the bucket state reported by the server."""
+        with self.lock:
+            self.used, self.capacity = used, capacity
+            self.updated = time.monotonic()
+
+    def wait(self):
+        """Sleep only if the bucket is nearly full."""
+        with self.lock:
+            used = max(0.0, self.used - (time.monotonic() - self.updated) * self.leak_rate)
+            delay = (used - self.capacity * 0.5) / self.leak_rate if used > self.capacity * BUCKET_HIGH_WATER else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+REST_BUCKET = LeakyBucket(40, 2.0)
+
+
+def shopify_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Admin API call that paces itself on the call-limit header and retries 429s."""
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        REST_BUCKET.wait()
+        resp = SHOPIFY_SESSION.request(method, url, **kwargs)
+        call_limit = resp.headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if call_limit:
+            used, capacity = call_limit.split("/")
+            REST_BUCKET.update(float(used), float(capacity))
+        if resp.status_code != 429 or attempt == MAX_THROTTLE_RETRIES:
+            return resp
+        time.sleep(float(resp.headers.get("Retry-After", 2)))
+
+
+_checkpoint_lock = threading.Lock()
+
+
+def load_checkpoint(path: str = CHECKPOINT_FILE) -> set:
+    """SKUs created by previous runs."""
+    if not Path(path).exists():
+        return set()
+    with open(path, "rb") as f:
+        return {_json_loads(line)["sku"] for line in f if line.strip()}
+
+
+def record_checkpoint(sku: str, product_id: int, path: str = CHECKPOINT_FILE):
+    """Append a created product to the checkpoint file."""
+    line = _json_dumps({"sku": sku, "product_id": product_id}) + b"\n"
+    with _checkpoint_lock, open(path, "ab") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+@lru_cache(maxsize=4096)
+def _scan_keywords(text: str) -> frozenset:
+    """The KEYWORDS_RE keywords that occur in text (case-insensitive).
+
+    Cached, so a product's name and specs are lowercased and scanned once for
+    its description, tags and product type together.
+    """
+    found = set(KEYWORDS_RE.findall(text.lower()))
+    if 'glass pipe' in found:
+        found.add('glass')
+    return frozenset(found)
+
 
 def load_products_from_excel(filepath: str) -> list:
     """Load products from the Cloud YHS Excel file."""
-    df = pd.read_excel(filepath, engine='openpyxl', skiprows=3)
+    df = pd.read_excel(filepath, engine=EXCEL_ENGINE, skiprows=3)
     df.columns = ['Product', 'SKU', 'Picture', 'Weight', 'Specs', 'Cost', 'Stock']
 
     # Filter out empty rows
     df = df[df['Product'].notna() & (df['Product'] != 'Product')]
 
     # Clean up cost column
-    df['Cost_Clean'] = df['Cost'].astype(str).str.replace('$', '').str.replace(',', '')
-    df['Cost_Clean'] = pd.to_numeric(df['Cost_Clean'], errors='coerce')
+    df['Cost_Clean'] = pd.to_numeric(df['Cost'].astype(str).str.replace(r'[$,]', '', regex=True), errors='coerce')
     df['Retail_Price'] = (df['Cost_Clean'] * 2).round(2)
 
     # Clean up stock
-    df['Stock_Clean'] = df['Stock'].astype(str).str.extract(r'(\d+)')[0].astype(float).fillna(0).astype(int)
-
-    products = []
-    for _, row in df.iterrows():
-        if pd.notna(row['Product']) and pd.notna(row['SKU']):
-            products.append({
-                'name': str(row['Product']).strip(),
-                'sku': str(row['SKU']).strip(),
-                'weight': str(row['Weight']) if pd.notna(row['Weight']) else '',
-                'specs': str(row['Specs']) if pd.notna(row['Specs']) else '',
-                'cost': float(row['Cost_Clean']) if pd.notna(row['Cost_Clean']) else 0,
-                'retail_price': float(row['Retail_Price']) if pd.notna(row['Retail_Price']) else 0,
-                'stock': int(row['Stock_Clean'])
-            })
-
-    return products
-
-
-def generate_oil_slick_description(product: dict) -> str:
-    """Generate a long-form description in Oil Slick style."""
-
-    name = product['name']
-    sku = product['sku']
-    specs = product['specs']
-    weight = product['weight']
-
-    # Parse specs for dimensions and materials
-    materials = []
-    dimensions = ""
-    if specs:
-        # Extract materials
-        if 'pvc' in specs.lower():
-            materials.append('PVC')
-        if 'glass' in specs.lower():
-            materials.append('glass')
-        if 'silicone' in specs.lower():
-            materials.append('silicone')
-        if 'plastic' in specs.lower():
-            materials.append('plastic')
+    df['Stock_Clean'] = pd.to_numeric(
+        df['Stock'].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce'
+    ).fillna(0).astype('int32')
 
-        # Extract dimensions
-        dim_match = re.search(r'(\d+\*\d+(?:\*\d+)?(?:mm)?)', specs)
-        if dim_match:
-            dimensions = dim_match.group(1)
+    # Build the output columns in one go instead of row by row
+    df = df[df['SKU'].notna()]
+    out = pd.DataFrame({
+        'name': df['Product'].astype(str).str.strip(),
+        'sku': df['SKU'].astype(str).str.strip(),
+        'weight': df['Weight'].astype(str).where(df['Weight'].notna(), ''),
+        'specs': df['Specs'].astype(str).where(df['Specs'].notna(), ''),
+        'cost': df['Cost_Clean'].fillna(0),
+        'retail_price': df['Retail_Price'].fillna(0),
+        'stock': df['Stock_Clean'],
+    })
 
-    material_str = ' and '.join(materials) if materials else 'quality materials'
+    return out.to_dict(orient='records')
 
-    # Determine product type
-    product_type = "water pipe"
-    if 'hand pipe' in name.lower():
-        product_type = "hand pipe"
-    elif 'nectar collector' in name.lower():
-        product_type = "nectar collector"
-    elif 'dab tool' in name.lower():
-        product_type = "dab tools"
-    elif 'battery' in name.lower():
-        product_type = "battery device"
-    elif 'bowl' in name.lower():
-        product_type = "glass bowl"
-    elif 'ashtray' in name.lower():
-        product_type = "ashtray"
-    elif 'jar' in name.lower():
-        product_type = "storage jar"
-    elif 'clip' in name.lower():
-        product_type = "roach clips"
 
-    # Generate description in Oil Slick style
-    description = f"""<p>The {name} is a unique {product_type} that brings character and function together in one piece. Built with {material_str}, this piece is designed to stand out in any collection while delivering smooth, reliable pulls every session.</p>
+# Oil Slick style description, filled in with str.format() by
+# generate_oil_slick_description()
+OIL_SLICK_TEMPLATE = """<p>The {name} is a unique {product_type} that brings character and function together in one piece. Built with {material_str}, this piece is designed to stand out in any collection while delivering smooth, reliable pulls every session.</p>
 
 <h2>Why you'll reach for this one</h2>
 <ul>
@@ -142,10 +261,10 @@ def generate_oil_slick_description(product: dict) -> str:
 <table>
 <tr><th>Reference SKU</th><td>{sku}</td></tr>
 <tr><th>Vendor</th><td>Cloud YHS</td></tr>
-<tr><th>Materials</th><td>{material_str.title()}</td></tr>
-{"<tr><th>Dimensions</th><td>" + dimensions + "</td></tr>" if dimensions else ""}
-{"<tr><th>Weight</th><td>" + weight + "</td></tr>" if weight else ""}
-<tr><th>Type</th><td>{product_type.title()}</td></tr>
+<tr><th>Materials</th><td>{material_title}</td></tr>
+{dimensions_row}
+{weight_row}
+<tr><th>Type</th><td>{product_type_title}</td></tr>
 </table>
 
 <h2>Care & cleaning</h2>
@@ -169,7 +288,66 @@ def generate_oil_slick_description(product: dict) -> str:
 
 <p>Looking for more unique pieces to add to your collection? Browse our full <a href="https://oilslickpad.com/collections/smoke-shop-products">smoke shop products</a> to find the perfect match for your style.</p>"""
 
-    return description
+
+def generate_oil_slick_description(product: dict) -> str:
+    """Generate a long-form description in Oil Slick style."""
+
+    name = product['name']
+    sku = product['sku']
+    specs = product['specs']
+    weight = product['weight']
+
+    # Parse specs for dimensions and materials
+    materials = []
+    dimensions = ""
+    if specs:
+        # Extract materials
+        spec_keywords = _scan_keywords(specs)
+        if 'pvc' in spec_keywords:
+            materials.append('PVC')
+        if 'glass' in spec_keywords:
+            materials.append('glass')
+        if 'silicone' in spec_keywords:
+            materials.append('silicone')
+        if 'plastic' in spec_keywords:
+            materials.append('plastic')
+
+        # Extract dimensions
+        dim_match = DIM_RE.search(specs)
+        if dim_match:
+            dimensions = dim_match.group(1)
+
+    material_str = ' and '.join(materials) if materials else 'quality materials'
+
+    # Determine product type
+    name_keywords = _scan_keywords(name)
+    product_type = "water pipe"
+    if 'hand pipe' in name_keywords:
+        product_type = "hand pipe"
+    elif 'nectar collector' in name_keywords:
+        product_type = "nectar collector"
+    elif 'dab tool' in name_keywords:
+        product_type = "dab tools"
+    elif 'battery' in name_keywords:
+        product_type = "battery device"
+    elif 'bowl' in name_keywords:
+        product_type = "glass bowl"
+    elif 'ashtray' in name_keywords:
+        product_type = "ashtray"
+    elif 'jar' in name_keywords:
+        product_type = "storage jar"
+    elif 'clip' in name_keywords:
+        product_type = "roach clips"
+
+    # Optional spec rows are left blank when there's nothing to show
+    dimensions_row = "<tr><th>Dimensions</th><td>" + dimensions + "</td></tr>" if dimensions else ""
+    weight_row = "<tr><th>Weight</th><td>" + weight + "</td></tr>" if weight else ""
+
+    return OIL_SLICK_TEMPLATE.format(
+        name=name, sku=sku, product_type=product_type, material_str=material_str,
+        material_title=material_str.title(), product_type_title=product_type.title(),
+        dimensions_row=dimensions_row, weight_row=weight_row
+    )
 
 
 def generate_product_tags(product: dict) -> str:
@@ -182,10 +360,16 @@ def generate_product_tags(product: dict) -> str:
     - family:vape-battery (not family:battery)
     - family:storage-accessory (not family:ashtray)
     """
-    name = product['name'].lower()
-    specs = product['specs'].lower() if product['specs'] else ''
+    return _tags_for(product['name'], product['sku'], product['specs'] or '')
+
+
+@lru_cache(maxsize=4096)
+def _tags_for(name: str, sku: str, specs: str) -> str:
+    """generate_product_tags() body, keyed on the product fields it reads."""
+    name = _scan_keywords(name)
+    specs = _scan_keywords(specs)
 
-    tags = [f"vendor:{VENDOR_NAME}", f"sku:{product['sku']}"]
+    tags = [f"vendor:{VENDOR_NAME}", f"sku:{sku}"]
 
     # Material tags
     if 'pvc' in specs:
@@ -210,7 +394,7 @@ def generate_product_tags(product: dict) -> str:
         tags.extend(["pillar:accessory", "family:dab-tool", "use:dabbing"])
     elif 'roach clip' in name:
         tags.extend(["pillar:accessory", "family:dab-tool", "use:flower-smoking"])
-    elif 'battery' in name or 'cbd' in name.lower():
+    elif 'battery' in name or 'cbd' in name:
         tags.extend(["pillar:smokeshop-device", "family:vape-battery", "use:vaping"])
     elif 'bowl' in name:
         tags.extend(["pillar:accessory", "family:flower-bowl", "use:flower-smoking"])
@@ -220,27 +404,28 @@ def generate_product_tags(product: dict) -> str:
     return ", ".join(tags)
 
 
+@lru_cache(maxsize=4096)
 def determine_product_type(name: str) -> str:
     """Determine the Shopify product type from the name."""
-    name_lower = name.lower()
+    keywords = _scan_keywords(name)
 
-    if 'water pipe' in name_lower or 'bong' in name_lower:
+    if 'water pipe' in keywords or 'bong' in keywords:
         return "Water Pipes"
-    elif 'hand pipe' in name_lower:
+    elif 'hand pipe' in keywords:
         return "Hand Pipes"
-    elif 'nectar collector' in name_lower:
+    elif 'nectar collector' in keywords:
         return "Nectar Collectors"
-    elif 'dab tool' in name_lower:
+    elif 'dab tool' in keywords:
         return "Dab Tools / Dabbers"
-    elif 'battery' in name_lower:
+    elif 'battery' in keywords:
         return "Batteries & Devices"
-    elif 'bowl' in name_lower:
+    elif 'bowl' in keywords:
         return "Bowls & Slides"
-    elif 'ashtray' in name_lower:
+    elif 'ashtray' in keywords:
         return "Ashtrays"
-    elif 'jar' in name_lower:
+    elif 'jar' in keywords:
         return "Storage Jars"
-    elif 'clip' in name_lower:
+    elif 'clip' in keywords:
         return "Accessories"
     else:
         return "Smoke Shop Products"
@@ -264,7 +449,7 @@ def create_shopify_product(product: dict) -> dict:
             "status": "draft",  # Start as draft until images are added
             "variants": [
                 {
-                    "price": str(product['retail_price']),
+                    "price": f"{product['retail_price']:.2f}",
                     "sku": product['sku'],
                     "inventory_management": "shopify",
                     "inventory_quantity": product['stock'],
@@ -275,20 +460,15 @@ def create_shopify_product(product: dict) -> dict:
         }
     }
 
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(
+    response = shopify_request(
+        "POST",
         f"{SHOPIFY_BASE_URL}/products.json",
-        headers=headers,
-        json=payload,
+        data=_json_dumps(payload),
         timeout=30
     )
 
     if response.status_code in [200, 201]:
-        result = response.json()
+        result = _json_loads(response.content)
         return {
             "success": True,
             "product_id": result["product"]["id"],
@@ -306,27 +486,23 @@ def search_reference_images(product_name: str, max_images: int = 3) -> list:
     """Search for reference images using DuckDuckGo."""
     import urllib.parse
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-
     # Clean up search term
     search_term = f"{product_name} product photo white background"
 
     try:
         # Get DuckDuckGo token
-        token_resp = requests.get("https://duckduckgo.com/", headers=headers, timeout=10)
-        vqd_match = re.search(r'vqd=([^&]+)', token_resp.text)
+        token_resp = WEB_SESSION.get("https://duckduckgo.com/", timeout=10)
+        vqd_match = VQD_RE.search(token_resp.text)
         if not vqd_match:
-            vqd_match = re.search(r"vqd='([^']+)'", token_resp.text)
+            vqd_match = VQD_QUOTED_RE.search(token_resp.text)
 
         if vqd_match:
             vqd = vqd_match.group(1)
             api_url = f"https://duckduckgo.com/i.js?q={urllib.parse.quote(search_term)}&vqd={vqd}&p=1"
 
-            img_resp = requests.get(api_url, headers=headers, timeout=10)
+            img_resp = WEB_SESSION.get(api_url, timeout=10)
             if img_resp.status_code == 200:
-                data = img_resp.json()
+                data = _json_loads(img_resp.content)
                 urls = []
                 for result in data.get("results", [])[:max_images]:
                     if result.get("image"):
@@ -340,11 +516,8 @@ def search_reference_images(product_name: str, max_images: int = 3) -> list:
 
 def download_image(url: str) -> bytes:
     """Download an image and return bytes."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
     try:
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = WEB_SESSION.get(url, timeout=30)
         if resp.status_code == 200:
             return resp.content
     except:
@@ -405,18 +578,13 @@ This is for an e-commerce listing. The generated image must be a clean, professi
         }
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": GOOGLE_API_KEY
-    }
-
     try:
-        response = requests.post(GEMINI_URL, headers=headers, json=payload, timeout=180)
+        response = GEMINI_SESSION.post(GEMINI_URL, data=_json_dumps(payload), timeout=180)
 
         if response.status_code != 200:
             return {"success": False, "error": f"API error {response.status_code}"}
 
-        result = response.json()
+        result = _json_loads(response.content)
         candidates = result.get("candidates", [])
 
         if not candidates:
@@ -438,31 +606,32 @@ This is for an e-commerce listing. The generated image must be a clean, professi
         return {"success": False, "error": str(e)}
 
 
-def upload_image_to_shopify(product_id: int, image_data: str, position: int = 1, alt_text: str = "") -> dict:
-    """Upload an image to a Shopify product."""
+def upload_image_to_shopify(product_id: int, image_data: Union[str, bytes], position: int = 1,
+                            alt_text: str = "") -> dict:
+    """Upload an image to a Shopify product.
 
-    payload = {
-        "image": {
-            "attachment": image_data,
-            "position": position,
-            "alt": alt_text
-        }
-    }
-
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(
+    image_data is the base64-encoded image, as str or bytes.
+    """
+    if isinstance(image_data, str):
+        image_data = image_data.encode("ascii")
+
+    # base64 output never needs JSON escaping, so the body is assembled as
+    # bytes around it instead of pushing a multi-MB str through json.dumps
+    body = b"".join((
+        b'{"image": {"attachment": "', image_data,
+        b'", "position": ', str(int(position)).encode(),
+        b', "alt": ', _json_dumps(alt_text), b'}}'
+    ))
+
+    response = shopify_request(
+        "POST",
         f"{SHOPIFY_BASE_URL}/products/{product_id}/images.json",
-        headers=headers,
-        json=payload,
+        data=body,
         timeout=60
     )
 
     if response.status_code in [200, 201]:
-        result = response.json()
+        result = _json_loads(response.content)
         return {
             "success": True,
             "image_id": result["image"]["id"],
@@ -485,92 +654,133 @@ def publish_product(product_id: int) -> dict:
         }
     }
 
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.put(
+    response = shopify_request(
+        "PUT",
         f"{SHOPIFY_BASE_URL}/products/{product_id}.json",
-        headers=headers,
-        json=payload,
+        data=_json_dumps(payload),
         timeout=30
     )
 
     return {"success": response.status_code in [200, 201]}
 
 
-def process_single_product(product: dict, generate_images: bool = True, image_folder: str = None) -> dict:
+# Extensions tried for a SKU's local image, in order of preference
+LOCAL_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.JPG', '.JPEG', '.PNG')
+
+
+@lru_cache(maxsize=8)
+def _index_image_folder(image_folder: str) -> dict:
+    """Map each file stem in image_folder to its preferred image file, listing the folder once."""
+    rank = {ext: i for i, ext in enumerate(LOCAL_IMAGE_EXTENSIONS)}
+    index = {}
+    with os.scandir(image_folder) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext in rank and entry.is_file():
+                best = index.get(stem)
+                if best is None or rank[ext] < rank[best.suffix]:
+                    index[stem] = Path(entry.path)
+    return index
+
+
+def find_product_image(image_folder: str, sku: str) -> Optional[Path]:
+    """The local image for a SKU (e.g. CY013.jpg), or None."""
+    try:
+        index = _index_image_folder(image_folder)
+    except (FileNotFoundError, NotADirectoryError):
+        return None  # No such folder: nothing local, and the miss isn't cached
+    return index.get(sku)
+
+
+def find_source_image(product: dict, image_folder: str = None, out: TextIO = None) -> Optional[bytes]:
+    """Source image for a product: the local file for its SKU, else the first online result."""
+    # First, check if there's a local image file matching SKU
+    if image_folder:
+        img_path = find_product_image(image_folder, product['sku'])
+        if img_path:
+            source_image = img_path.read_bytes()
+            print(f"  ✓ Found local image: {img_path.name}", file=out)
+            if source_image:
+                return source_image
+
+    # If no local image, search online
+    print("    Searching online for source image...", file=out)
+    ref_urls = search_reference_images(product['name'])
+    if ref_urls:
+        source_image = download_image(ref_urls[0])
+        if source_image:
+            print(f"  ✓ Downloaded source image", file=out)
+            return source_image
+        print("  ✗ Failed to download source image", file=out)
+    return None
+
+
+def process_single_product(product: dict, generate_images: bool = True, image_folder: str = None,
+                           out: TextIO = None) -> dict:
     """Process a single product: create in Shopify, generate images, upload.
 
+    Progress is printed to out (stdout by default).
+
     Image workflow (when generate_images=True):
     1. Find source image (from folder by SKU, or search online)
     2. Generate high-fidelity copy with Gemini → becomes Image #1
     3. Upload original source image → becomes Image #2
     """
 
-    print(f"\n{'='*60}")
-    print(f"Processing: {product['name']}")
-    print(f"SKU: {product['sku']} | Cost: ${product['cost']:.2f} | Retail: ${product['retail_price']:.2f}")
-    print(f"{'='*60}")
+    print(f"\n{'='*60}", file=out)
+    print(f"Processing: {product['name']}", file=out)
+    print(f"SKU: {product['sku']} | Cost: ${product['cost']:.2f} | Retail: ${product['retail_price']:.2f}", file=out)
+    print(f"{'='*60}", file=out)
+
+    # The source image lookup doesn't need the product ID, so it runs while
+    # the product is being created
+    if generate_images:
+        lookup_log = StringIO()
+        source_lookup = LOOKUP_POOL.submit(find_source_image, product, image_folder, lookup_log)
 
     # Step 1: Create product in Shopify
-    print("  [1/4] Creating product in Shopify...")
+    print("  [1/4] Creating product in Shopify...", file=out)
     create_result = create_shopify_product(product)
 
     if not create_result['success']:
-        print(f"  ✗ Failed: {create_result['error']}")
+        if generate_images:
+            source_lookup.cancel()  # Not needed; a lookup already running is just ignored
+        print(f"  ✗ Failed: {create_result['error']}", file=out)
         return {"success": False, "error": create_result['error']}
 
     product_id = create_result['product_id']
-    print(f"  ✓ Created product ID: {product_id}")
+    record_checkpoint(product['sku'], product_id)
+    print(f"  ✓ Created product ID: {product_id}", file=out)
 
     if not generate_images:
-        print("  [2/4] Skipping image generation (disabled)")
-        print("  [3/4] Skipping image upload")
-        print("  [4/4] Publishing product...")
+        print("  [2/4] Skipping image generation (disabled)", file=out)
+        print("  [3/4] Skipping image upload", file=out)
+        print("  [4/4] Publishing product...", file=out)
         publish_product(product_id)
         return {"success": True, "product_id": product_id, "images": 0}
 
     # Step 2: Find source image
-    print("  [2/4] Finding source image...")
-    source_image = None
-    source_url = None
-
-    # First, check if there's a local image file matching SKU
-    if image_folder:
-        sku = product['sku']
-        for ext in ['.jpg', '.jpeg', '.png', '.webp', '.JPG', '.JPEG', '.PNG']:
-            img_path = Path(image_folder) / f"{sku}{ext}"
-            if img_path.exists():
-                with open(img_path, 'rb') as f:
-                    source_image = f.read()
-                print(f"  ✓ Found local image: {img_path.name}")
-                break
-
-    # If no local image, search online
-    if not source_image:
-        print("    Searching online for source image...")
-        ref_urls = search_reference_images(product['name'])
-        if ref_urls:
-            source_url = ref_urls[0]
-            source_image = download_image(source_url)
-            if source_image:
-                print(f"  ✓ Downloaded source image")
-            else:
-                print("  ✗ Failed to download source image")
+    print("  [2/4] Finding source image...", file=out)
+    try:
+        source_image = source_lookup.result()
+    except Exception as e:
+        source_image = None
+        print(lookup_log.getvalue(), end="", file=out)
+        print(f"  ✗ Source image lookup failed: {e}", file=out)
+    else:
+        print(lookup_log.getvalue(), end="", file=out)
 
     if not source_image:
-        print("  ✗ No source image found - skipping image generation")
-        print("  [4/4] Publishing product as draft...")
+        print("  ✗ No source image found - skipping image generation", file=out)
+        print("  [4/4] Publishing product as draft...", file=out)
         return {"success": True, "product_id": product_id, "images": 0}
 
     # Step 3: Generate high-fidelity copy and upload both images
-    print("  [3/4] Generating high-fidelity copy with Gemini 3 Pro...")
+    print("  [3/4] Generating high-fidelity copy with Gemini 3 Pro...", file=out)
     images_uploaded = 0
 
     # Generate high-fidelity copy → Image #1
-    print("    Creating high-fidelity copy...", end=" ")
+    print("    Creating high-fidelity copy...", end=" ", file=out)
     gen_result = generate_high_fidelity_copy(source_image, product['name'])
 
     if gen_result['success']:
@@ -581,18 +791,16 @@ def process_single_product(product: dict, generate_images: bool = True, image_fo
             alt_text=f"{product['name']} - Main Image"
         )
         if upload_result['success']:
-            print("✓ Uploaded as Image #1")
+            print("✓ Uploaded as Image #1", file=out)
             images_uploaded += 1
         else:
-            print(f"✗ Upload failed")
+            print(f"✗ Upload failed", file=out)
     else:
-        print(f"✗ Generation failed: {gen_result.get('error', 'Unknown error')[:50]}")
-
-    time.sleep(1)
+        print(f"✗ Generation failed: {gen_result.get('error', 'Unknown error')[:50]}", file=out)
 
     # Upload original source → Image #2
-    print("    Uploading original source...", end=" ")
-    source_b64 = base64.b64encode(source_image).decode('utf-8')
+    print("    Uploading original source...", end=" ", file=out)
+    source_b64 = base64.b64encode(source_image)
     upload_result = upload_image_to_shopify(
         product_id,
         source_b64,
@@ -600,18 +808,18 @@ def process_single_product(product: dict, generate_images: bool = True, image_fo
         alt_text=f"{product['name']} - Original"
     )
     if upload_result['success']:
-        print("✓ Uploaded as Image #2")
+        print("✓ Uploaded as Image #2", file=out)
         images_uploaded += 1
     else:
-        print("✗ Upload failed")
+        print("✗ Upload failed", file=out)
 
     # Step 4: Publish product
-    print(f"  [4/4] Publishing product ({images_uploaded} images)...")
+    print(f"  [4/4] Publishing product ({images_uploaded} images)...", file=out)
     if images_uploaded > 0:
         publish_product(product_id)
-        print("  ✓ Product published!")
+        print("  ✓ Product published!", file=out)
     else:
-        print("  ⚠ Keeping as draft (no images)")
+        print("  ⚠ Keeping as draft (no images)", file=out)
 
     return {
         "success": True,
@@ -620,6 +828,14 @@ def process_single_product(product: dict, generate_images: bool = True, image_fo
     }
 
 
+def _process_to_log(product: dict, generate_images: bool, image_folder: str) -> tuple:
+    """process_single_product() with its progress captured, for running in a worker."""
+    out = StringIO()
+    result = process_single_product(product, generate_images=generate_images,
+                                    image_folder=image_folder, out=out)
+    return result, out.getvalue()
+
+
 def main():
     """Main entry point."""
     import argparse
@@ -632,6 +848,10 @@ def main():
     parser.add_argument("--no-images", action="store_true", help="Skip image generation")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without making changes")
     parser.add_argument("--list", action="store_true", help="List all products and exit")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Skip products already created by a previous run (from {CHECKPOINT_FILE})")
+    parser.add_argument("--workers", "-w", type=int, default=IMPORT_WORKERS,
+                        help=f"Products imported concurrently (default: {IMPORT_WORKERS})")
 
     args = parser.parse_args()
 
@@ -649,6 +869,12 @@ def main():
     end_idx = args.start + args.count if args.count else len(products)
     selected = products[args.start:end_idx]
 
+    if args.resume:
+        done = load_checkpoint()
+        skipped = len(selected)
+        selected = [p for p in selected if p['sku'] not in done]
+        print(f"\nResuming: skipping {skipped - len(selected)} products already created")
+
     print(f"\nProcessing products {args.start+1} to {min(end_idx, len(products))} ({len(selected)} total)")
 
     if args.dry_run:
@@ -669,21 +895,29 @@ def main():
     # Process products
     results = {"success": 0, "failed": 0, "total_images": 0}
 
-    for i, product in enumerate(selected):
-        print(f"\n[{i+1}/{len(selected)}]", end="")
-        result = process_single_product(
-            product,
-            generate_images=not args.no_images,
-            image_folder=args.images
-        )
-
-        if result['success']:
-            results['success'] += 1
-            results['total_images'] += result.get('images', 0)
-        else:
-            results['failed'] += 1
-
-        time.sleep(1)  # Rate limiting between products
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [
+            pool.submit(_process_to_log, product, not args.no_images, args.images)
+            for product in selected
+        ]
+
+        # Report in spreadsheet order as each product finishes
+        for i, future in enumerate(futures):
+            print(f"\n[{i+1}/{len(selected)}]", end="")
+            try:
+                result, log = future.result()
+            except Exception as e:
+                # One product's error shouldn't stop the batch or lose the others' logs
+                print(f"\n  ✗ Error processing {selected[i]['sku']}: {e}")
+                results['failed'] += 1
+                continue
+            print(log, end="")
+
+            if result['success']:
+                results['success'] += 1
+                results['total_images'] += result.get('images', 0)
+            else:
+                results['failed'] += 1
 
     # Summary
     print(f"\n{'='*60}")
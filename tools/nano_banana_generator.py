@@ -27,14 +27,23 @@ Usage:
 """
 
 import argparse
-import base64
+import binascii
+import hashlib
 import json
+import mmap
 import os
+import random
 import re
+import shutil
 import sys
+import threading
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
 from pathlib import Path
+from types import MappingProxyType
 from typing import Optional, List
 
 try:
@@ -45,77 +54,122 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "-q"])
     import requests
 
+# Optional: pybase64 is a SIMD drop-in for the base64 module's b64encode/b64decode
+try:
+    import pybase64 as base64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    import base64
+    PYBASE64_AVAILABLE = False
+
+# Optional: orjson parses the multi-megabyte base64 image responses much faster
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional: requests-cache keeps competitor search results and downloads on disk
+try:
+    import requests_cache
+    REQUESTS_CACHE_AVAILABLE = True
+except ImportError:
+    REQUESTS_CACHE_AVAILABLE = False
+
+# Optional: the ddgs library is a maintained DuckDuckGo client; without it
+# search_competitor_images() falls back to scraping the vqd token
+try:
+    from ddgs import DDGS
+    from ddgs.exceptions import RatelimitException
+    DDGS_AVAILABLE = True
+except ImportError:
+    DDGS_AVAILABLE = False
+
+# Optional: Pillow is only needed for --downscale-refs
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
 # Configuration - Set these environment variables:
 # GOOGLE_API_KEY - Your Google AI API key from https://aistudio.google.com/apikey
 # SHOPIFY_ACCESS_TOKEN - Your Shopify Admin API access token
 # SHOPIFY_STORE - Your Shopify store domain (e.g., mystore.myshopify.com)
 API_KEY = os.environ.get("GOOGLE_API_KEY", "")
 BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+UPLOAD_BASE_URL = "https://generativelanguage.googleapis.com/upload/v1beta"
+SHOPIFY_API_VERSION = "2024-01"
+
+
+@dataclass(frozen=True, slots=True)
+class ModelConfig:
+    """Immutable configuration for one image generation model."""
+    id: str
+    endpoint: str
+    type: str
+    description: str
+    image_size: Optional[str] = None  # Gemini 3 Pro supports 1K, 2K, 4K
+
 
 # Model configurations - Updated January 2026
 # Nano Banana Pro (Gemini 3 Pro Image) is the flagship model
-MODELS = {
+_MODEL_CONFIGS = {
     # FLAGSHIP: Gemini 3 Pro Image Preview - Highest quality (DEFAULT)
-    "gemini": {
-        "id": "gemini-3-pro-image-preview",
-        "endpoint": "generateContent",
-        "type": "gemini",
-        "image_size": "2K",  # Supports 1K, 2K, 4K
-        "description": "Nano Banana Pro (Gemini 3 Pro) - FLAGSHIP model, 2K output"
-    },
-    # Alias for flagship
-    "gemini-pro": {
-        "id": "gemini-3-pro-image-preview",
-        "endpoint": "generateContent",
-        "type": "gemini",
-        "image_size": "2K",
-        "description": "Nano Banana Pro (Gemini 3 Pro) - FLAGSHIP model, 2K output"
-    },
+    "gemini": ModelConfig(
+        id="gemini-3-pro-image-preview",
+        endpoint="generateContent",
+        type="gemini",
+        image_size="2K",
+        description="Nano Banana Pro (Gemini 3 Pro) - FLAGSHIP model, 2K output"
+    ),
     # 4K version for maximum quality
-    "gemini-4k": {
-        "id": "gemini-3-pro-image-preview",
-        "endpoint": "generateContent",
-        "type": "gemini",
-        "image_size": "4K",
-        "description": "Nano Banana Pro 4K - Maximum resolution output"
-    },
+    "gemini-4k": ModelConfig(
+        id="gemini-3-pro-image-preview",
+        endpoint="generateContent",
+        type="gemini",
+        image_size="4K",
+        description="Nano Banana Pro 4K - Maximum resolution output"
+    ),
     # Fast/budget option
-    "gemini-flash": {
-        "id": "gemini-2.5-flash-image",
-        "endpoint": "generateContent",
-        "type": "gemini",
-        "image_size": None,
-        "description": "Gemini 2.5 Flash Image - Fast, budget-friendly"
-    },
-    # Legacy alias for backwards compatibility
-    "gemini-2.5": {
-        "id": "gemini-2.5-flash-image",
-        "endpoint": "generateContent",
-        "type": "gemini",
-        "image_size": None,
-        "description": "Gemini 2.5 Flash Image (legacy alias)"
-    },
+    "gemini-flash": ModelConfig(
+        id="gemini-2.5-flash-image",
+        endpoint="generateContent",
+        type="gemini",
+        description="Gemini 2.5 Flash Image - Fast, budget-friendly"
+    ),
     # Imagen models (require billing)
-    "imagen3": {
-        "id": "imagen-3.0-generate-002",
-        "endpoint": "predict",
-        "type": "imagen",
-        "description": "Imagen 3 - High quality (requires billing)"
-    },
-    "imagen4": {
-        "id": "imagen-4.0-generate-001",
-        "endpoint": "predict",
-        "type": "imagen",
-        "description": "Imagen 4 Standard (requires billing)"
-    },
-    "imagen4-ultra": {
-        "id": "imagen-4.0-ultra-generate-001",
-        "endpoint": "predict",
-        "type": "imagen",
-        "description": "Imagen 4 Ultra - Maximum quality (requires billing)"
-    },
+    "imagen3": ModelConfig(
+        id="imagen-3.0-generate-002",
+        endpoint="predict",
+        type="imagen",
+        description="Imagen 3 - High quality (requires billing)"
+    ),
+    "imagen4": ModelConfig(
+        id="imagen-4.0-generate-001",
+        endpoint="predict",
+        type="imagen",
+        description="Imagen 4 Standard (requires billing)"
+    ),
+    "imagen4-ultra": ModelConfig(
+        id="imagen-4.0-ultra-generate-001",
+        endpoint="predict",
+        type="imagen",
+        description="Imagen 4 Ultra - Maximum quality (requires billing)"
+    ),
 }
 
+# Aliases share their target's config instead of duplicating it
+MODEL_ALIASES = {
+    "gemini-pro": "gemini",        # Alias for flagship
+    "gemini-2.5": "gemini-flash",  # Legacy alias for backwards compatibility
+}
+
+MODELS = MappingProxyType({
+    **_MODEL_CONFIGS,
+    **{alias: _MODEL_CONFIGS[target] for alias, target in MODEL_ALIASES.items()},
+})
+
 # Default model is the flagship Nano Banana Pro
 DEFAULT_MODEL = "gemini"
 
@@ -125,6 +179,308 @@ ASPECT_RATIOS = ["1:1", "3:4", "4:3", "9:16", "16:9"]
 # Image sizes for Imagen
 IMAGE_SIZES = ["1024x1024", "1536x1536", "2048x2048"]
 
+# Prompt wrappers, built once and filled per call with str.format()
+REFERENCE_PROMPT_TEMPLATE = """You are given {count} reference images of similar products from competitors.
+Study these reference images carefully to understand:
+- The exact product type and shape
+- How the product is photographed (angle, lighting, positioning)
+- The realistic appearance and materials
+
+Now generate a NEW professional e-commerce product photograph based on this description:
+
+{prompt}
+
+CRITICAL REQUIREMENTS:
+- The generated image must match the STYLE and QUALITY of the reference images
+- Photorealistic rendering - must look like a real photograph, not AI-generated
+- Clean pure white background (#FFFFFF)
+- Professional studio lighting with soft shadows
+- Sharp focus, extremely high detail
+- Commercial quality suitable for online retail
+- ABSOLUTELY NO text, watermarks, labels, or logos anywhere in the image
+- Product should be the sole focus
+- Match the realistic appearance seen in the reference images"""
+
+PLAIN_PROMPT_TEMPLATE = """Generate a professional e-commerce product photograph.
+
+{prompt}
+
+CRITICAL REQUIREMENTS:
+- Photorealistic rendering - must look like a real photograph
+- Clean pure white background (#FFFFFF)
+- Professional studio lighting with soft shadows
+- Sharp focus, extremely high detail
+- Commercial quality suitable for online retail
+- ABSOLUTELY NO text, watermarks, labels, or logos anywhere in the image
+- Product should be the sole focus
+- Accurate representation of the product's real-world appearance"""
+
+IMAGEN_PROMPT_TEMPLATE = "Professional e-commerce product photograph, studio lighting, white background, sharp focus, commercial quality: {prompt}"
+
+# Reference image MIME types by file extension
+REFERENCE_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif"
+}
+
+# On-disk cache of generated images, keyed by model, prompt and references.
+# Bump CACHE_VERSION whenever the prompt templates change to invalidate it.
+# Off by default: generation is nondeterministic and repeated prompts are usually
+# asking for another take, so only reuse images when --cache is given.
+CACHE_ENABLED = False  # --cache turns this on
+CACHE_VERSION = "v1"
+CACHE_DIR = Path(os.environ.get("NANO_BANANA_CACHE_DIR", Path.home() / ".cache" / "nano_banana"))
+# Least recently used images are evicted once the cache grows past this size
+CACHE_MAX_BYTES = int(os.environ.get("NANO_BANANA_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Running size of CACHE_DIR, scanned once on the first write and kept up to date after
+_cache_bytes = None
+_cache_bytes_lock = threading.Lock()
+
+# A successful test_api_key() is trusted for this long (stored as a key hash)
+API_KEY_CHECK_TTL_S = 60 * 60
+API_KEY_CHECK_FILE = "api_key_ok.json"
+_verified_api_keys = set()
+
+# How long cached competitor searches and reference downloads stay fresh.
+# The DDG token page itself is never cached (tokens expire quickly).
+WEB_CACHE_TTL_S = 24 * 60 * 60
+
+# Images generated concurrently in preset mode (--workers)
+GENERATION_WORKERS = 3
+
+# --downscale-refs: shrink references to this longest side (JPEG re-encode)
+# before base64. Gemini does not need camera-resolution references.
+REFERENCE_MAX_SIDE = 2048
+REFERENCE_JPEG_QUALITY = 85
+
+# DuckDuckGo search token, embedded either as a URL parameter (vqd=...&) or a
+# quoted JS string (vqd='...'). Matched on the raw bytes of the page.
+_VQD_RE = re.compile(rb"vqd=['\"]?([^'\"&]+)")
+
+# A DuckDuckGo vqd token is reused for this long before fetching a new one
+VQD_TTL_S = 300
+
+# Search queries are reduced to plain words before going to ddgs; other
+# characters become spaces so tokens like "3x4.5" stay separate words
+_QUERY_SANITIZE_RE = re.compile(r"[^A-Za-z0-9.]+")
+
+# Characters that cannot appear in generated file names
+_FILENAME_TRANSLATION = str.maketrans({" ": "_", "/": "-"})
+
+# Maximum concurrent competitor image downloads, and the streaming chunk size
+DOWNLOAD_WORKERS = 5
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Downloaded references are named by their leading bytes, since image hosts
+# often send a generic or wrong Content-Type. WebP is RIFF....WEBP.
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG", "png"),
+    (b"GIF8", "gif"),
+)
+CONTENT_TYPE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+
+# Downloaded competitor images are shrunk to this longest side as they land
+# (needs Pillow). They are only style references, and DDG often serves 1-3 MB
+# originals that would otherwise be base64-encoded into every request.
+COMPETITOR_REFERENCE_MAX_SIDE = 1024
+
+# Generated images are base64-decoded to disk in slices of this many
+# characters (a multiple of 4, so every slice is independently decodable)
+DECODE_CHUNK_SIZE = 1 << 20
+
+# Background writer for generated images. Batch runs hand the base64 decode
+# and disk write to this pool so the next API request can start right away.
+_SAVE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nano-banana-save")
+
+
+# Retry policy for API calls: exponential backoff with jitter on 429/5xx and
+# dropped connections. Retry-After is honored when the server sends it.
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 16
+# Shopify REST uses a leaky bucket (X-Shopify-Shop-Api-Call-Limit: used/limit).
+# Pause briefly once the bucket is this full so the next call is not a 429.
+SHOPIFY_BUCKET_THRESHOLD = 0.9
+
+# Keep-alive connection pool for Shopify Admin calls. A preset upload sends
+# one request per generated image, so reusing the TLS connection matters.
+_SHOPIFY_SESSION = requests.Session()
+_SHOPIFY_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+# Same for the Gemini/Imagen endpoints: every variant in a preset run is a
+# separate generateContent call against the same host. Retries are handled
+# by _post_with_retry(), so the adapter itself does not retry.
+_GEMINI_SESSION = requests.Session()
+_GEMINI_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8))
+
+# Request pacing. Calls only wait when they would exceed these rates, instead
+# of sleeping a fixed interval after every image or search.
+GEMINI_REQUESTS_PER_MINUTE = 30
+SEARCH_REQUESTS_PER_SECOND = 1
+
+
+class _RateLimiter:
+    """Thread-safe token bucket: up to `rate` acquisitions per `period` seconds."""
+
+    def __init__(self, rate: float, period: float):
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, sleeping only if the bucket is empty."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance is this caller's place in the queue
+            wait = -self.tokens / self.fill_rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+_GEMINI_LIMITER = _RateLimiter(GEMINI_REQUESTS_PER_MINUTE, 60)
+_SEARCH_LIMITER = _RateLimiter(SEARCH_REQUESTS_PER_SECOND, 1)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for the given (0-based) attempt."""
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)) + random.uniform(0, BACKOFF_BASE_S)
+
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds from a numeric Retry-After header, or None."""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _respect_shopify_call_limit(response) -> None:
+    """Sleep when Shopify reports the API call bucket is nearly full."""
+    call_limit = response.headers.get("X-Shopify-Shop-Api-Call-Limit")
+    if not call_limit:
+        return
+    try:
+        used, limit = (int(n) for n in call_limit.split("/"))
+    except ValueError:
+        return
+    if used >= limit * SHOPIFY_BUCKET_THRESHOLD:
+        # The bucket leaks 2 calls/second on standard plans
+        time.sleep((used - limit * SHOPIFY_BUCKET_THRESHOLD + 1) / 2)
+
+
+def _post_with_retry(url: str, headers: dict, body: bytes, timeout: int,
+                     retries: int = MAX_RETRIES, session=None, limiter=None):
+    """POST with exponential backoff on 429/5xx responses and connection errors.
+
+    Returns the final response (which may still be an error status once
+    retries are exhausted). Re-raises the last connection error.
+    Pass a requests.Session to reuse its pooled connections, and a
+    _RateLimiter to pace every attempt against a quota.
+    """
+    http = session or requests
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = http.post(url, headers=headers, data=body, timeout=timeout)
+        except requests.exceptions.ConnectionError:
+            if attempt == retries:
+                raise
+            wait = _backoff_delay(attempt)
+        else:
+            if attempt == retries or (response.status_code != 429 and response.status_code < 500):
+                if session is _SHOPIFY_SESSION:
+                    _respect_shopify_call_limit(response)
+                return response
+            wait = _retry_after(response) or _backoff_delay(attempt)
+        print(f"  Retry {attempt + 1}/{retries} in {wait:.1f}s...")
+        time.sleep(wait)
+
+
+_WEB_SESSION = None
+
+
+def _web_session():
+    """Session for competitor search and reference downloads.
+
+    With requests-cache installed this is an on-disk HTTP cache, so re-running
+    a preset skips the image search and the downloads. The vqd token is left
+    out of the cache key because DDG issues a new one every run.
+    """
+    global _WEB_SESSION
+    if _WEB_SESSION is None:
+        if REQUESTS_CACHE_AVAILABLE:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _WEB_SESSION = requests_cache.CachedSession(
+                str(CACHE_DIR / "http_cache"),
+                backend="sqlite",
+                expire_after=WEB_CACHE_TTL_S,
+                allowable_methods=("GET",),
+                ignored_parameters=["vqd"],
+                urls_expire_after={
+                    "duckduckgo.com/i.js": WEB_CACHE_TTL_S,
+                    "duckduckgo.com": requests_cache.DO_NOT_CACHE,
+                },
+            )
+        else:
+            _WEB_SESSION = requests.Session()
+    return _WEB_SESSION
+
+
+def _b64encode_str(data) -> str:
+    """Base64-encode bytes straight to a str (no intermediate bytes copy with pybase64)."""
+    if PYBASE64_AVAILABLE:
+        return base64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("ascii")
+
+
+def _safe_filename(text: str) -> str:
+    """Make text usable as a file name (spaces -> '_', slashes -> '-')."""
+    return text.translate(_FILENAME_TRANSLATION)
+
+
+def _b64decode(data: str) -> bytes:
+    """Decode a base64 str from an API response without first copying it to bytes.
+
+    stdlib b64decode() encodes a str argument to ASCII bytes before decoding;
+    binascii.a2b_base64() and pybase64 read the str buffer directly.
+    """
+    if PYBASE64_AVAILABLE:
+        return base64.b64decode(data, validate=False)
+    return binascii.a2b_base64(data)
+
+
+def _encode_file_b64(path) -> str:
+    """Base64-encode a file by memory-mapping it instead of reading it into a bytes copy."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""  # mmap cannot map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _b64encode_str(mm)
+
+
+def _json_dumps(payload) -> bytes:
+    """Serialize a request payload, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+def _json_loads(content: bytes):
+    """Parse a response body, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(content)
+    return json.loads(content)
+
 # =============================================================================
 # PRODUCT PRESETS - Pre-configured settings for specific products
 # =============================================================================
@@ -184,11 +540,139 @@ CRITICAL: No text, no labels, no logos.""",
 }
 
 
+@dataclass(frozen=True, slots=True)
+class PresetVariant:
+    """One product variant of a preset (size, display name, optional finish)."""
+    size: str = ""
+    name: str = ""
+    finish: str = ""
+
+    @property
+    def label(self) -> str:
+        return self.name or self.size or "Unknown"
+
+
+@dataclass(frozen=True, slots=True)
+class Preset:
+    """Immutable preset built from a PRODUCT_PRESETS entry.
+
+    prompts holds the filled-in base_prompt for each variant, in order; they
+    never change at runtime, so they are built once at import.
+    """
+    key: str
+    name: str
+    product_id: Optional[int]
+    search_terms: tuple
+    variants: tuple
+    base_prompt: str
+    finish_prompts: MappingProxyType
+    aspect_ratio: str
+    num_images: int
+    prompts: tuple
+
+    @classmethod
+    def from_config(cls, key: str, config: dict) -> "Preset":
+        variants = tuple(
+            PresetVariant(size=v.get("size", ""), name=v.get("name", ""), finish=v.get("finish", ""))
+            for v in config.get("variants", ())
+        ) or DEFAULT_PRESET_VARIANTS
+        finish_prompts = MappingProxyType(dict(config.get("finish_prompts", {})))
+        prompts = tuple(
+            config["base_prompt"].format(
+                size=variant.size,
+                name=variant.name,
+                finish_detail=finish_prompts.get(variant.finish, "")
+            )
+            for variant in variants
+        )
+        return cls(
+            key=key,
+            name=config["name"],
+            product_id=config.get("product_id"),
+            search_terms=tuple(config.get("search_terms", ())),
+            variants=variants,
+            base_prompt=config["base_prompt"],
+            finish_prompts=finish_prompts,
+            aspect_ratio=config.get("aspect_ratio", "1:1"),
+            num_images=config.get("num_images", 1),
+            prompts=prompts,
+        )
+
+
+# Presets without a variants list generate a single standard image
+DEFAULT_PRESET_VARIANTS = (PresetVariant(size="standard", name="Standard"),)
+
+# Read-only presets used at runtime; edit PRODUCT_PRESETS above to add one
+PRESETS = MappingProxyType({
+    key: Preset.from_config(key, config) for key, config in PRODUCT_PRESETS.items()
+})
+
+
+def _ddgs_image_results(ddgs, term: str, max_results: int) -> List[dict]:
+    """Image search through the ddgs library, backing off when rate limited.
+
+    Only rate limits are retried; any other error is raised to the caller.
+    """
+    query = _QUERY_SANITIZE_RE.sub(" ", term).strip()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return list(ddgs.images(query, max_results=max_results))
+        except RatelimitException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            wait = _backoff_delay(attempt + 1)
+            print(f"  DDG search throttled ({e}), retrying in {wait:.1f}s...")
+            time.sleep(wait)
+
+
+_vqd = None
+_vqd_fetched_at = 0.0
+
+
+def _get_vqd(session, headers: dict) -> Optional[str]:
+    """DuckDuckGo vqd token, fetched at most once per VQD_TTL_S and shared across search terms."""
+    global _vqd, _vqd_fetched_at
+    if _vqd and time.time() - _vqd_fetched_at < VQD_TTL_S:
+        return _vqd
+
+    # DuckDuckGo requires a token, so we'll use their API endpoint
+    token_resp = session.get("https://duckduckgo.com/", headers=headers, timeout=10)
+
+    # Extract vqd token (bytes search skips decoding the whole page)
+    vqd_match = _VQD_RE.search(token_resp.content)
+    if not vqd_match:
+        return None
+
+    _vqd = vqd_match.group(1).decode("ascii", "replace")
+    _vqd_fetched_at = time.time()
+    return _vqd
+
+
+def _scrape_ddg_image_results(session, term: str, headers: dict, max_results: int) -> List[dict]:
+    """Image search by scraping DuckDuckGo's vqd token and i.js endpoint (fallback without ddgs)."""
+    vqd = _get_vqd(session, headers)
+    if not vqd:
+        return []
+
+    api_url = f"https://duckduckgo.com/i.js?q={urllib.parse.quote(term)}&vqd={vqd}&p=1"
+
+    img_resp = session.get(api_url, headers=headers, timeout=10)
+    if img_resp.status_code != 200:
+        return []
+    try:
+        return _json_loads(img_resp.content).get("results", [])[:max_results]
+    except ValueError:
+        return []
+
+
 def search_competitor_images(search_terms: List[str], max_images: int = 6) -> List[dict]:
     """
     Search for competitor product images using DuckDuckGo image search.
     Returns list of image URLs that can be used as references.
 
+    Uses the ddgs library when installed (with backoff on rate limits),
+    otherwise scrapes DuckDuckGo directly.
+
     Args:
         search_terms: List of search queries
         max_images: Maximum number of images to return (max 6 for high-fidelity reference)
@@ -202,45 +686,29 @@ def search_competitor_images(search_terms: List[str], max_images: int = 6) -> Li
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
     }
+    session = _web_session()
+    ddgs = DDGS() if DDGS_AVAILABLE else None
 
     for term in search_terms[:3]:  # Limit to 3 search terms
         if len(images) >= max_images:
             break
 
         try:
-            # Use DuckDuckGo image search
-            search_url = f"https://duckduckgo.com/?q={urllib.parse.quote(term)}&iax=images&ia=images"
             print(f"  Searching: {term}")
+            _SEARCH_LIMITER.acquire()
+            if ddgs is not None:
+                results = _ddgs_image_results(ddgs, term, 3)
+            else:
+                results = _scrape_ddg_image_results(session, term, headers, 3)
 
-            # DuckDuckGo requires a token, so we'll use their API endpoint
-            token_url = "https://duckduckgo.com/"
-            token_resp = requests.get(token_url, headers=headers, timeout=10)
-
-            # Extract vqd token
-            vqd_match = re.search(r'vqd=([^&]+)', token_resp.text)
-            if not vqd_match:
-                vqd_match = re.search(r"vqd='([^']+)'", token_resp.text)
-
-            if vqd_match:
-                vqd = vqd_match.group(1)
-                api_url = f"https://duckduckgo.com/i.js?q={urllib.parse.quote(term)}&vqd={vqd}&p=1"
-
-                img_resp = requests.get(api_url, headers=headers, timeout=10)
-                if img_resp.status_code == 200:
-                    try:
-                        data = img_resp.json()
-                        for result in data.get("results", [])[:3]:
-                            if len(images) < max_images:
-                                images.append({
-                                    "url": result.get("image"),
-                                    "thumbnail": result.get("thumbnail"),
-                                    "title": result.get("title", ""),
-                                    "source": result.get("source", "")
-                                })
-                    except:
-                        pass
-
-            time.sleep(1)  # Rate limiting
+            for result in results:
+                if len(images) < max_images:
+                    images.append({
+                        "url": result.get("image"),
+                        "thumbnail": result.get("thumbnail"),
+                        "title": result.get("title", ""),
+                        "source": result.get("source", "")
+                    })
 
         except Exception as e:
             print(f"  Warning: Search failed for '{term}': {e}")
@@ -250,91 +718,311 @@ def search_competitor_images(search_terms: List[str], max_images: int = 6) -> Li
     return images
 
 
+def _sniff_image_extension(head: bytes, content_type: str) -> str:
+    """File extension for an image from its first bytes, else its Content-Type."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip().lower(), "jpg")
+
+
+def _download_reference(index: int, url: str, output_path: Path, headers: dict, session) -> Optional[str]:
+    """Download one reference image. Returns the saved path, or None on a non-200 response.
+
+    The body is streamed to disk in chunks rather than buffered in memory.
+    """
+    with session.get(url, headers=headers, timeout=30, stream=True) as resp:
+        if resp.status_code != 200:
+            return None
+
+        chunks = resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        first_chunk = next(chunks, b"")
+        ext = _sniff_image_extension(first_chunk, resp.headers.get("content-type", ""))
+
+        filepath = output_path / f"reference_{index+1}.{ext}"
+        try:
+            with open(filepath, "wb") as f:
+                f.write(first_chunk)
+                for chunk in chunks:
+                    f.write(chunk)
+        except Exception:
+            filepath.unlink(missing_ok=True)  # Don't leave a truncated reference behind
+            raise
+
+    if PIL_AVAILABLE:
+        filepath = _shrink_downloaded_reference(filepath)
+    return str(filepath)
+
+
+def _shrink_downloaded_reference(filepath: Path) -> Path:
+    """Re-encode a downloaded reference as a COMPETITOR_REFERENCE_MAX_SIDE JPEG.
+
+    Returns the path of the file to use, which is the original when the image
+    is already small or Pillow cannot read it.
+    """
+    try:
+        data = _downscale_reference(filepath, COMPETITOR_REFERENCE_MAX_SIDE)
+    except Exception:
+        return filepath
+    if data is None:
+        return filepath
+
+    shrunk_path = filepath.with_suffix(".jpg")
+    shrunk_path.write_bytes(data)
+    if shrunk_path != filepath:
+        filepath.unlink(missing_ok=True)
+    return shrunk_path
+
+
 def download_reference_images(image_urls: List[str], output_dir: str = "./reference_images") -> List[str]:
     """
     Download reference images to local files.
 
+    The URLs usually point at different hosts, so they are fetched concurrently
+    (up to DOWNLOAD_WORKERS at a time) and total time is bounded by the slowest
+    server rather than the sum of all of them.
+
     Args:
         image_urls: List of image URLs to download
         output_dir: Directory to save images
 
     Returns:
-        List of local file paths
+        List of local file paths, in the same order as image_urls
     """
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
     downloaded = []
+    if not image_urls:
+        return downloaded
+
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
     }
 
-    for i, url in enumerate(image_urls):
-        try:
-            print(f"  Downloading reference {i+1}/{len(image_urls)}...")
-            resp = requests.get(url, headers=headers, timeout=30)
-
-            if resp.status_code == 200:
-                # Determine extension from content type
-                content_type = resp.headers.get("content-type", "image/jpeg")
-                ext = "jpg" if "jpeg" in content_type else "png" if "png" in content_type else "jpg"
-
-                filepath = output_path / f"reference_{i+1}.{ext}"
-                with open(filepath, "wb") as f:
-                    f.write(resp.content)
-
-                downloaded.append(str(filepath))
+    session = _web_session()
+    print(f"  Downloading {len(image_urls)} reference images...")
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(image_urls))) as pool:
+        futures = [
+            pool.submit(_download_reference, i, url, output_path, headers, session)
+            for i, url in enumerate(image_urls)
+        ]
+        for i, future in enumerate(futures):
+            try:
+                filepath = future.result()
+            except Exception as e:
+                print(f"    ✗ Failed to download reference {i+1}: {e}")
+                continue
+            if filepath:
+                downloaded.append(filepath)
                 print(f"    ✓ Saved: {filepath}")
 
-            time.sleep(0.5)
-
-        except Exception as e:
-            print(f"    ✗ Failed to download: {e}")
-
     return downloaded
 
 
-def load_reference_images(image_paths: List[str]) -> List[dict]:
+def _downscale_reference(path, max_side: int) -> Optional[bytes]:
+    """Re-encode an image as JPEG with its longest side <= max_side.
+
+    Returns None when the image is already small enough to send as-is.
+    """
+    with Image.open(path) as img:
+        if max(img.size) <= max_side:
+            return None
+        # For JPEGs, let libjpeg decode at a reduced scale instead of full size
+        img.draft("RGB", (max_side, max_side))
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # Flatten transparent product shots onto white rather than black
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=REFERENCE_JPEG_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+
+def _file_sha256(path) -> str:
+    """sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_reference(path, max_side: Optional[int] = None, encode: bool = True) -> dict:
+    """Load one reference image, downscaled if requested.
+
+    With encode=True the dict carries base64 'data' for inline_data parts;
+    otherwise it carries the raw 'bytes' (downscaled) or the file 'path' for
+    upload through the Gemini File API.
+    """
+    if max_side and PIL_AVAILABLE:
+        resized = _downscale_reference(path, max_side)
+        if resized is not None:
+            digest = hashlib.sha256(resized).hexdigest()
+            if encode:
+                return {"mime_type": "image/jpeg", "data": _b64encode_str(resized), "sha256": digest}
+            return {"mime_type": "image/jpeg", "bytes": resized, "sha256": digest}
+
+    # The digest is over the raw image bytes in both modes, so inline and
+    # File API references to the same image share generated-image cache keys
+    mime_type = REFERENCE_MIME_TYPES.get(Path(path).suffix.lower(), "image/jpeg")
+    if encode:
+        return {"mime_type": mime_type, "data": _encode_file_b64(path), "sha256": _file_sha256(path)}
+    return {"mime_type": mime_type, "path": str(path), "sha256": _file_sha256(path)}
+
+
+def load_reference_images(image_paths: List[str], max_side: Optional[int] = None,
+                          encode: bool = True) -> List[dict]:
     """
     Load reference images and convert to base64 for API.
 
     Args:
         image_paths: List of local file paths
+        max_side: Downscale references larger than this (longest side, pixels)
+            before encoding. Requires Pillow; None sends the original files.
+        encode: Base64-encode for inline use. Pass False when the references
+            will go through upload_reference_files() instead.
 
     Returns:
-        List of dicts with 'mime_type' and 'data' (base64)
+        List of dicts with 'mime_type', 'sha256' (cache key) and either
+        'data' (base64) or, with encode=False, 'path'/'bytes'
     """
     images = []
-
-    for path in image_paths[:6]:  # Max 6 high-fidelity reference images
-        try:
-            with open(path, "rb") as f:
-                data = base64.b64encode(f.read()).decode("utf-8")
-
-            # Determine MIME type
-            ext = Path(path).suffix.lower()
-            mime_type = {
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".png": "image/png",
-                ".webp": "image/webp",
-                ".gif": "image/gif"
-            }.get(ext, "image/jpeg")
-
-            images.append({
-                "mime_type": mime_type,
-                "data": data
-            })
+    paths = image_paths[:6]  # Max 6 high-fidelity reference images
+    if not paths:
+        return images
+
+    if max_side and not PIL_AVAILABLE:
+        print("  Warning: Pillow not installed, sending references at full size")
+        print("  Install with: pip install Pillow")
+
+    # Read and encode all references at once so cold-disk reads overlap;
+    # results are collected in the original order.
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        futures = [pool.submit(_load_reference, path, max_side, encode) for path in paths]
+
+        for path, future in zip(paths, futures):
+            try:
+                images.append(future.result())
+            except Exception as e:
+                print(f"  Warning: Could not load {path}: {e}")
+                continue
             print(f"  Loaded reference: {path}")
 
+    return images
+
+
+def _upload_reference_file(ref: dict) -> dict:
+    """Upload one reference to the Gemini File API (resumable protocol, raw bytes).
+
+    Returns a reference dict with 'file_uri' in place of the image data.
+    """
+    if "bytes" in ref:
+        body, size = ref["bytes"], len(ref["bytes"])
+        display_name = f"reference-{ref['sha256'][:12]}"
+    else:
+        body, size = None, os.path.getsize(ref["path"])
+        display_name = Path(ref["path"]).name
+
+    start = _post_with_retry(
+        f"{UPLOAD_BASE_URL}/files",
+        {
+            "x-goog-api-key": API_KEY,
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": ref["mime_type"],
+            "Content-Type": "application/json"
+        },
+        _json_dumps({"file": {"display_name": display_name}}),
+        timeout=30,
+        session=_GEMINI_SESSION
+    )
+    upload_url = start.headers.get("X-Goog-Upload-URL")
+    if start.status_code != 200 or not upload_url:
+        raise RuntimeError(f"File API start failed {start.status_code}: {start.text[:200]}")
+
+    upload_headers = {
+        "Content-Length": str(size),
+        "X-Goog-Upload-Offset": "0",
+        "X-Goog-Upload-Command": "upload, finalize"
+    }
+    if body is None:
+        with open(ref["path"], "rb") as f:
+            response = _GEMINI_SESSION.post(upload_url, headers=upload_headers, data=f, timeout=120)
+    else:
+        response = _GEMINI_SESSION.post(upload_url, headers=upload_headers, data=body, timeout=120)
+    if response.status_code != 200:
+        raise RuntimeError(f"File API upload failed {response.status_code}: {response.text[:200]}")
+
+    return {
+        "mime_type": ref["mime_type"],
+        "file_uri": _json_loads(response.content)["file"]["uri"],
+        "sha256": ref["sha256"]
+    }
+
+
+def upload_reference_files(references: List[dict]) -> List[dict]:
+    """
+    Upload references loaded with encode=False to the Gemini File API.
+
+    Each image is sent once as raw bytes and then referenced by URI from every
+    generation request, instead of re-sending it base64-encoded per variant.
+    A reference that fails to upload falls back to inline base64 data.
+
+    Args:
+        references: Dicts from load_reference_images(..., encode=False)
+
+    Returns:
+        List of reference dicts usable by generate_image()
+    """
+    uploaded = []
+    for ref in references:
+        try:
+            uploaded.append(_upload_reference_file(ref))
         except Exception as e:
-            print(f"  Warning: Could not load {path}: {e}")
+            print(f"  Warning: File API upload failed ({e}), sending reference inline")
+            raw = ref["bytes"] if "bytes" in ref else Path(ref["path"]).read_bytes()
+            uploaded.append({"mime_type": ref["mime_type"], "data": _b64encode_str(raw), "sha256": ref["sha256"]})
+    return uploaded
 
-    return images
+
+def _api_key_verified_recently(key_digest: str) -> bool:
+    """True if this key passed test_api_key() within API_KEY_CHECK_TTL_S."""
+    if key_digest in _verified_api_keys:
+        return True
+    try:
+        record = _json_loads((CACHE_DIR / API_KEY_CHECK_FILE).read_bytes())
+    except (OSError, ValueError):
+        return False
+    return (record.get("key_sha256") == key_digest
+            and time.time() - record.get("checked_at", 0) < API_KEY_CHECK_TTL_S)
 
 
-def test_api_key(verbose: bool = True) -> dict:
-    """Test if the API key is valid and has required permissions."""
+def _remember_verified_api_key(key_digest: str) -> None:
+    """Record a successful key check in-process and on disk (hash only, never the key)."""
+    _verified_api_keys.add(key_digest)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        (CACHE_DIR / API_KEY_CHECK_FILE).write_bytes(
+            _json_dumps({"key_sha256": key_digest, "checked_at": time.time()})
+        )
+    except OSError:
+        pass  # Caching is best-effort
+
+
+def test_api_key(verbose: bool = True, use_cache: bool = True) -> dict:
+    """Test if the API key is valid and has required permissions.
+
+    A successful check is remembered for API_KEY_CHECK_TTL_S, so repeat runs
+    skip the network round-trip. Pass use_cache=False to always re-check.
+    """
 
     if not API_KEY:
         if verbose:
@@ -342,6 +1030,12 @@ def test_api_key(verbose: bool = True) -> dict:
             print("Set it with: export GOOGLE_API_KEY='your-api-key'")
         return {"success": False, "error": "GOOGLE_API_KEY not set"}
 
+    key_digest = hashlib.sha256(API_KEY.encode("utf-8")).hexdigest()
+    if use_cache and _api_key_verified_recently(key_digest):
+        if verbose:
+            print("[Nano Banana] ✓ API key is valid (verified recently)")
+        return {"success": True, "message": "API key valid", "cached": True}
+
     if verbose:
         print(f"[Nano Banana] Testing API key: {API_KEY[:20]}...")
 
@@ -359,12 +1053,14 @@ def test_api_key(verbose: bool = True) -> dict:
     }
 
     try:
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=30)
+        # Same pooled session as generation, so a --test before a run leaves a warm connection
+        response = _GEMINI_SESSION.post(endpoint, headers=headers, data=_json_dumps(payload), timeout=30)
 
         if response.status_code == 200:
             if verbose:
                 print("[Nano Banana] ✓ API key is valid!")
                 print("[Nano Banana] ✓ Generative Language API is enabled")
+            _remember_verified_api_key(key_digest)
             return {"success": True, "message": "API key valid"}
         elif response.status_code == 403:
             error_info = """
@@ -395,6 +1091,22 @@ Current key: {key}
         return {"success": False, "error": str(e)}
 
 
+def _reference_part_json(ref: dict) -> bytes:
+    """Serialized Gemini request part for a reference image.
+
+    Built on first use and kept on the reference dict, so the base64 data is
+    only walked by the JSON encoder once however many images reuse it.
+    """
+    part_json = ref.get("part_json")
+    if part_json is None:
+        if "file_uri" in ref:
+            part = {"file_data": {"mime_type": ref["mime_type"], "file_uri": ref["file_uri"]}}
+        else:
+            part = {"inline_data": {"mime_type": ref["mime_type"], "data": ref["data"]}}
+        part_json = ref["part_json"] = _json_dumps(part)
+    return part_json
+
+
 def generate_image_gemini(
     prompt: str,
     model_id: str,
@@ -423,58 +1135,22 @@ def generate_image_gemini(
 
     # Build the prompt with reference image context
     if reference_images:
-        enhanced_prompt = f"""You are given {len(reference_images)} reference images of similar products from competitors.
-Study these reference images carefully to understand:
-- The exact product type and shape
-- How the product is photographed (angle, lighting, positioning)
-- The realistic appearance and materials
-
-Now generate a NEW professional e-commerce product photograph based on this description:
-
-{prompt}
-
-CRITICAL REQUIREMENTS:
-- The generated image must match the STYLE and QUALITY of the reference images
-- Photorealistic rendering - must look like a real photograph, not AI-generated
-- Clean pure white background (#FFFFFF)
-- Professional studio lighting with soft shadows
-- Sharp focus, extremely high detail
-- Commercial quality suitable for online retail
-- ABSOLUTELY NO text, watermarks, labels, or logos anywhere in the image
-- Product should be the sole focus
-- Match the realistic appearance seen in the reference images"""
+        enhanced_prompt = REFERENCE_PROMPT_TEMPLATE.format(count=len(reference_images), prompt=prompt)
     else:
-        enhanced_prompt = f"""Generate a professional e-commerce product photograph.
-
-{prompt}
-
-CRITICAL REQUIREMENTS:
-- Photorealistic rendering - must look like a real photograph
-- Clean pure white background (#FFFFFF)
-- Professional studio lighting with soft shadows
-- Sharp focus, extremely high detail
-- Commercial quality suitable for online retail
-- ABSOLUTELY NO text, watermarks, labels, or logos anywhere in the image
-- Product should be the sole focus
-- Accurate representation of the product's real-world appearance"""
+        enhanced_prompt = PLAIN_PROMPT_TEMPLATE.format(prompt=prompt)
 
-    # Build parts list - reference images first, then prompt
+    # Build parts list - reference images first, then prompt. Reference parts
+    # are serialized once per image and reused by every call that shares them.
     parts = []
 
     # Add reference images if provided (Gemini 3 Pro supports up to 14)
     if reference_images:
-        for i, ref_img in enumerate(reference_images[:6]):  # Max 6 for high-fidelity
-            parts.append({
-                "inline_data": {
-                    "mime_type": ref_img["mime_type"],
-                    "data": ref_img["data"]
-                }
-            })
+        parts = [_reference_part_json(ref_img) for ref_img in reference_images[:6]]  # Max 6 for high-fidelity
         if verbose:
             print(f"[Nano Banana Pro] Using {len(reference_images[:6])} reference images")
 
     # Add the text prompt
-    parts.append({"text": enhanced_prompt})
+    parts.append(_json_dumps({"text": enhanced_prompt}))
 
     # Build imageConfig based on model capabilities
     image_config = {"aspectRatio": aspect_ratio}
@@ -483,16 +1159,16 @@ CRITICAL REQUIREMENTS:
     if image_size and "gemini-3" in model_id:
         image_config["imageSize"] = image_size
 
-    # Payload format for Gemini 3 Pro and 2.5+ models
-    payload = {
-        "contents": [{
-            "parts": parts
-        }],
-        "generationConfig": {
-            "responseModalities": ["TEXT", "IMAGE"],
-            "imageConfig": image_config
-        }
+    # Payload format for Gemini 3 Pro and 2.5+ models:
+    # {"contents": [{"parts": [...]}], "generationConfig": {...}}
+    generation_config = {
+        "responseModalities": ["TEXT", "IMAGE"],
+        "imageConfig": image_config
     }
+    body = b"".join((
+        b'{"contents":[{"parts":[', b",".join(parts), b']}],"generationConfig":',
+        _json_dumps(generation_config), b"}",
+    ))
 
     if verbose:
         print(f"[Nano Banana Pro] Using model: {model_id}")
@@ -502,12 +1178,13 @@ CRITICAL REQUIREMENTS:
         print(f"[Nano Banana Pro] Generating image with advanced reasoning...")
 
     try:
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=180)
+        response = _post_with_retry(endpoint, headers, body, timeout=180,
+                                    session=_GEMINI_SESSION, limiter=_GEMINI_LIMITER)
 
         if response.status_code != 200:
             return {"success": False, "error": f"API error {response.status_code}: {response.text[:500]}"}
 
-        result = response.json()
+        result = _json_loads(response.content)
         candidates = result.get("candidates", [])
 
         if not candidates:
@@ -561,7 +1238,7 @@ def generate_image_imagen(
     }
 
     # Enhanced prompt for product photography
-    enhanced_prompt = f"""Professional e-commerce product photograph, studio lighting, white background, sharp focus, commercial quality: {prompt}"""
+    enhanced_prompt = IMAGEN_PROMPT_TEMPLATE.format(prompt=prompt)
 
     payload = {
         "instances": [{"prompt": enhanced_prompt}],
@@ -576,12 +1253,13 @@ def generate_image_imagen(
         print(f"[Nano Banana] Generating {num_images} image(s)...")
 
     try:
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=120)
+        response = _post_with_retry(endpoint, headers, _json_dumps(payload), timeout=120,
+                                    session=_GEMINI_SESSION, limiter=_GEMINI_LIMITER)
 
         if response.status_code != 200:
             return {"success": False, "error": f"API error {response.status_code}: {response.text[:500]}"}
 
-        result = response.json()
+        result = _json_loads(response.content)
         predictions = result.get("predictions", [])
 
         if not predictions:
@@ -606,13 +1284,130 @@ def generate_image_imagen(
         return {"success": False, "error": str(e)}
 
 
+def _generate_image_imagen_single(prompt, model_id, aspect_ratio, image_size, reference_images, verbose):
+    """Adapt generate_image_imagen() to the generate_image_gemini() call signature."""
+    return generate_image_imagen(prompt, model_id, aspect_ratio, 1, verbose)
+
+
+# Model key -> (generator, model_id, image_size, description), resolved once at
+# import so generate_image() does a single lookup per call
+MODEL_DISPATCH = {
+    key: (
+        generate_image_gemini if config.type == "gemini" else _generate_image_imagen_single,
+        config.id,
+        config.image_size,
+        config.description,
+    )
+    for key, config in MODELS.items()
+}
+
+
+def _reference_digest(ref: dict) -> str:
+    """sha256 of a reference image (precomputed by load_reference_images when possible)."""
+    return ref.get("sha256") or hashlib.sha256(_b64decode(ref["data"])).hexdigest()
+
+
+def _cache_path(model_id: str, image_size: Optional[str], aspect_ratio: str,
+                prompt: str, reference_images: Optional[List[dict]]) -> Path:
+    """Content-addressed cache location for a generation request."""
+    key = hashlib.sha256()
+    for field in (CACHE_VERSION, model_id, image_size or "", aspect_ratio, prompt):
+        key.update(field.encode("utf-8"))
+        key.update(b"\0")
+    for digest in sorted(_reference_digest(ref) for ref in reference_images or []):
+        key.update(digest.encode("ascii"))
+    return CACHE_DIR / f"{CACHE_VERSION}-{key.hexdigest()}.png"
+
+
+def _write_image(image_data: str, saved_path: Path, cache_path: Optional[Path] = None) -> str:
+    """Decode base64 image data and write it to disk. Returns the saved path.
+
+    When cache_path is given the file is also copied into the cache, via a
+    temp file and os.replace() so readers never see a partial image.
+    """
+    # Decode in fixed slices so only one chunk of binary data is alive at a time
+    with open(saved_path, "wb") as f:
+        for start in range(0, len(image_data), DECODE_CHUNK_SIZE):
+            f.write(_b64decode(image_data[start:start + DECODE_CHUNK_SIZE]))
+
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique per process and thread, so identical requests never share a temp file
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            shutil.copyfile(saved_path, tmp_path)
+            replaced = cache_path.stat().st_size if cache_path.exists() else 0
+            os.replace(tmp_path, cache_path)
+            _account_cache_write(saved_path.stat().st_size - replaced)
+        except OSError:
+            pass  # Caching is best-effort
+    return str(saved_path)
+
+
+def _account_cache_write(delta: int) -> None:
+    """Add a cache write to the running total, pruning only once it exceeds CACHE_MAX_BYTES."""
+    global _cache_bytes
+    with _cache_bytes_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _prune_image_cache(CACHE_MAX_BYTES)  # First write: one scan establishes the total
+        else:
+            _cache_bytes += delta
+            if _cache_bytes > CACHE_MAX_BYTES:
+                _cache_bytes = _prune_image_cache(CACHE_MAX_BYTES)
+
+
+def _prune_image_cache(max_bytes: int = CACHE_MAX_BYTES) -> int:
+    """Delete the least recently used cached images until the cache fits max_bytes.
+
+    Cache hits refresh a file's mtime, so mtime order is LRU order.
+    Returns the size of the cache afterwards.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".png") and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return total
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # Another worker already evicted it
+        total -= size
+    return total
+
+
+def wait_for_saves(results: List[dict]) -> None:
+    """Block until background saves queued by generate_image() have finished.
+
+    Results whose save failed lose their 'path' and get a 'save_error' instead.
+    """
+    for result in results:
+        future = result.pop("save_future", None)
+        if future is None:
+            continue
+        try:
+            future.result()
+        except Exception as e:
+            result.pop("path", None)
+            result["save_error"] = str(e)
+
+
 def generate_image(
     prompt: str,
     model: str = "gemini",
     aspect_ratio: str = "1:1",
     output_path: Optional[str] = None,
     reference_images: List[dict] = None,
-    verbose: bool = True
+    verbose: bool = True,
+    background_save: bool = False
 ) -> dict:
     """
     Generate an image using the specified model.
@@ -624,23 +1419,26 @@ def generate_image(
         output_path: Path to save the generated image
         reference_images: List of reference images (dicts with 'mime_type' and 'data')
         verbose: Print progress messages
+        background_save: Decode and write the image on a worker thread. The
+            result then carries a 'save_future'; call wait_for_saves() before
+            reading the file.
 
     Returns:
-        dict with 'success', 'image_data', 'path', 'error'
+        dict with 'success', 'image_data', 'path', 'error' ('cached' and no
+        'image_data' when the image was copied from the on-disk cache)
     """
 
-    if model not in MODELS:
+    dispatch = MODEL_DISPATCH.get(model)
+    if dispatch is None:
         available = ", ".join(MODELS.keys())
         return {"success": False, "error": f"Unknown model '{model}'. Available: {available}"}
 
-    model_config = MODELS[model]
-    model_id = model_config["id"]
-    model_type = model_config["type"]
-    image_size = model_config.get("image_size")  # 1K, 2K, 4K for Gemini 3 Pro
+    # image_size is 1K, 2K, 4K for Gemini 3 Pro, None otherwise
+    generator, model_id, image_size, description = dispatch
 
     if verbose:
         print(f"\n{'='*60}")
-        print(f"[Nano Banana Pro] {model_config['description']}")
+        print(f"[Nano Banana Pro] {description}")
         print(f"[Nano Banana Pro] Aspect Ratio: {aspect_ratio}")
         if image_size:
             print(f"[Nano Banana Pro] Output Resolution: {image_size}")
@@ -649,11 +1447,24 @@ def generate_image(
         print(f"[Nano Banana Pro] Prompt: {prompt[:100]}...")
         print(f"{'='*60}")
 
-    # Generate based on model type
-    if model_type == "gemini":
-        result = generate_image_gemini(prompt, model_id, aspect_ratio, image_size, reference_images, verbose)
-    else:
-        result = generate_image_imagen(prompt, model_id, aspect_ratio, 1, verbose)
+    # Identical request already generated: copy it from the cache
+    cache_path = None
+    if CACHE_ENABLED and output_path:
+        cache_path = _cache_path(model_id, image_size, aspect_ratio, prompt, reference_images)
+        if cache_path.exists():
+            saved_path = Path(output_path)
+            saved_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                shutil.copyfile(cache_path, saved_path)
+                os.utime(cache_path)  # Mark as recently used for eviction
+            except OSError:
+                pass  # Evicted by another worker meanwhile: generate it again
+            else:
+                if verbose:
+                    print(f"[Nano Banana] ✓ Cache hit, saved to: {saved_path}")
+                return {"success": True, "cached": True, "path": str(saved_path), "model": model_id}
+
+    result = generator(prompt, model_id, aspect_ratio, image_size, reference_images, verbose)
 
     # Save image if successful and path provided
     if result["success"] and output_path and result.get("image_data"):
@@ -661,12 +1472,15 @@ def generate_image(
             saved_path = Path(output_path)
             saved_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(saved_path, "wb") as f:
-                f.write(base64.b64decode(result["image_data"]))
-
-            result["path"] = str(saved_path)
-            if verbose:
-                print(f"[Nano Banana] ✓ Saved to: {saved_path}")
+            if background_save:
+                result["save_future"] = _SAVE_EXECUTOR.submit(_write_image, result["image_data"], saved_path, cache_path)
+                result["path"] = str(saved_path)
+                if verbose:
+                    print(f"[Nano Banana] Saving in background: {saved_path}")
+            else:
+                result["path"] = _write_image(result["image_data"], saved_path, cache_path)
+                if verbose:
+                    print(f"[Nano Banana] ✓ Saved to: {saved_path}")
         except Exception as e:
             result["save_error"] = str(e)
 
@@ -676,15 +1490,33 @@ def generate_image(
     return result
 
 
+def _generate_image_task(task: dict) -> dict:
+    """Generate one image from a task dict (worker for the batch generators)."""
+    return generate_image(
+        prompt=task["prompt"],
+        model=task["model"],
+        aspect_ratio=task["aspect_ratio"],
+        output_path=task["output_path"],
+        reference_images=task.get("reference_images"),
+        verbose=task["verbose"],
+        background_save=True
+    )
+
+
 def generate_product_images(
     product_name: str,
     product_description: str,
     variants: Optional[list] = None,
     model: str = "gemini",
     output_dir: str = "./generated_images",
-    aspect_ratio: str = "1:1"
+    aspect_ratio: str = "1:1",
+    workers: int = GENERATION_WORKERS
 ) -> list:
-    """Generate product images for e-commerce."""
+    """Generate product images for e-commerce.
+
+    The main image and each variant are generated concurrently on up to
+    `workers` threads; results come back in the same order.
+    """
 
     results = []
     output_path = Path(output_dir)
@@ -697,30 +1529,34 @@ Professional product photography, clean white background, studio lighting, sharp
     print(f"Generating images for: {product_name}")
     print(f"{'='*60}")
 
-    # Main product image
-    filename = product_name.replace(" ", "_").replace("/", "-")[:50]
-    main_result = generate_image(
-        prompt=base_prompt,
-        model=model,
-        aspect_ratio=aspect_ratio,
-        output_path=output_path / f"{filename}_main.png"
-    )
-    results.append({"type": "main", "result": main_result})
-
-    # Variant images
-    if variants:
-        for variant in variants:
-            time.sleep(2)  # Rate limiting
-            variant_prompt = f"{base_prompt} Variant: {variant}"
-
-            variant_result = generate_image(
-                prompt=variant_prompt,
-                model=model,
-                aspect_ratio=aspect_ratio,
-                output_path=output_path / f"{filename}_{variant.replace(' ', '_')}.png"
-            )
-            results.append({"type": f"variant_{variant}", "result": variant_result})
+    workers = max(1, workers)
+    filename = _safe_filename(product_name)[:50]
+
+    # Main product image, then one per variant
+    jobs = [("main", base_prompt, output_path / f"{filename}_main.png")]
+    for variant in variants or []:
+        jobs.append((
+            f"variant_{variant}",
+            f"{base_prompt} Variant: {variant}",
+            output_path / f"{filename}_{_safe_filename(variant)}.png"
+        ))
+
+    tasks = [
+        {
+            "prompt": prompt,
+            "model": model,
+            "aspect_ratio": aspect_ratio,
+            "output_path": str(path),
+            "verbose": workers == 1
+        }
+        for _, prompt, path in jobs
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (job_type, _, _), result in zip(jobs, pool.map(_generate_image_task, tasks)):
+            results.append({"type": job_type, "result": result})
 
+    wait_for_saves([r["result"] for r in results])
     return results
 
 
@@ -730,7 +1566,9 @@ def generate_from_preset(
     upload_to_shopify_product: bool = False,
     model: str = "gemini",
     output_dir: str = "./generated_images",
-    num_images_per_variant: int = 1
+    num_images_per_variant: int = 1,
+    workers: int = GENERATION_WORKERS,
+    downscale_refs: bool = False
 ) -> dict:
     """
     Generate product images using a preset configuration.
@@ -743,17 +1581,20 @@ def generate_from_preset(
         model: Model to use (default: gemini = Nano Banana Pro)
         output_dir: Directory to save generated images
         num_images_per_variant: Number of images to generate per variant
+        workers: Number of images to generate concurrently (1 = sequential,
+            with full progress output)
+        downscale_refs: Shrink reference images to REFERENCE_MAX_SIDE before encoding
 
     Returns:
         dict with results for each variant
     """
-    if preset_name not in PRODUCT_PRESETS:
-        available = ", ".join(PRODUCT_PRESETS.keys())
+    if preset_name not in PRESETS:
+        available = ", ".join(PRESETS.keys())
         return {"success": False, "error": f"Unknown preset '{preset_name}'. Available: {available}"}
 
-    preset = PRODUCT_PRESETS[preset_name]
+    preset = PRESETS[preset_name]
     print(f"\n{'='*70}")
-    print(f"  NANO BANANA PRO - PRESET: {preset['name']}")
+    print(f"  NANO BANANA PRO - PRESET: {preset.name}")
     print(f"{'='*70}")
 
     output_path = Path(output_dir)
@@ -763,7 +1604,7 @@ def generate_from_preset(
     reference_images = []
     if search_competitors:
         print(f"\n[Step 1/4] Searching for competitor reference images...")
-        competitor_results = search_competitor_images(preset["search_terms"], max_images=6)
+        competitor_results = search_competitor_images(preset.search_terms, max_images=6)
 
         if competitor_results:
             # Download the reference images
@@ -771,7 +1612,12 @@ def generate_from_preset(
             if image_urls:
                 downloaded_paths = download_reference_images(image_urls, output_dir=f"{output_dir}/references")
                 if downloaded_paths:
-                    reference_images = load_reference_images(downloaded_paths)
+                    # Upload once to the File API; every variant then refers to them by URI
+                    reference_images = upload_reference_files(load_reference_images(
+                        downloaded_paths, max_side=REFERENCE_MAX_SIDE if downscale_refs else None, encode=False
+                    ))
+                    for ref in reference_images:
+                        _reference_part_json(ref)  # Serialize once, before the workers share them
                     print(f"  ✓ Loaded {len(reference_images)} reference images")
         else:
             print("  ⚠ No competitor images found, proceeding without references")
@@ -782,67 +1628,70 @@ def generate_from_preset(
     print(f"\n[Step 2/4] Generating product images...")
     results = {"preset": preset_name, "variants": [], "success": True}
 
-    variants = preset.get("variants", [{"size": "standard", "name": "Standard"}])
-    aspect_ratio = preset.get("aspect_ratio", "1:1")
+    variants = preset.variants
+    aspect_ratio = preset.aspect_ratio
+    workers = max(1, workers)
 
-    for i, variant in enumerate(variants):
-        print(f"\n  Variant {i+1}/{len(variants)}: {variant.get('name', variant.get('size', 'Unknown'))}")
+    # Build one task per image up front, then run them on a small worker pool.
+    # Generation is network-bound, so threads overlap the API round-trips.
+    tasks = []
+    for i, (variant, prompt) in enumerate(zip(variants, preset.prompts)):
+        safe_name = _safe_filename(f"{variant.size or 'std'}_{variant.finish or 'default'}")
 
-        # Build the prompt from preset
-        base_prompt = preset["base_prompt"]
-
-        # Replace placeholders
-        prompt = base_prompt.format(
-            size=variant.get("size", ""),
-            name=variant.get("name", ""),
-            finish_detail=preset.get("finish_prompts", {}).get(variant.get("finish", ""), "")
-        )
-
-        variant_results = []
         for img_num in range(num_images_per_variant):
-            # Generate unique filename
-            safe_name = f"{variant.get('size', 'std')}_{variant.get('finish', 'default')}".replace(" ", "_").replace("/", "-")
             filename = f"{preset_name}_{safe_name}_{img_num+1}.png"
-            filepath = output_path / filename
-
-            result = generate_image(
-                prompt=prompt,
-                model=model,
-                aspect_ratio=aspect_ratio,
-                output_path=str(filepath),
-                reference_images=reference_images if reference_images else None
-            )
+            tasks.append({
+                "variant_index": i,
+                "filename": filename,
+                "prompt": prompt,
+                "model": model,
+                "aspect_ratio": aspect_ratio,
+                "output_path": str(output_path / filename),
+                "reference_images": reference_images if reference_images else None,
+                "verbose": workers == 1
+            })
+
+    print(f"  {len(tasks)} images across {len(variants)} variants ({workers} worker{'s' if workers > 1 else ''})")
+
+    variant_results = [[] for _ in variants]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for task, result in zip(tasks, pool.map(_generate_image_task, tasks)):
+            variant = variants[task["variant_index"]]
+            label = variant.label
 
             if result["success"]:
-                result["filepath"] = str(filepath)
+                result["filepath"] = task["output_path"]
                 result["variant"] = variant
-                variant_results.append(result)
-                print(f"    ✓ Generated: {filename}")
+                variant_results[task["variant_index"]].append(result)
+                print(f"    ✓ Generated: {task['filename']} ({label})")
             else:
-                print(f"    ✗ Failed: {result.get('error', 'Unknown error')}")
+                print(f"    ✗ Failed: {task['filename']} ({label}): {result.get('error', 'Unknown error')}")
                 results["success"] = False
 
-            time.sleep(2)  # Rate limiting between images
+    results["variants"] = [
+        {"variant": variant, "images": images}
+        for variant, images in zip(variants, variant_results)
+    ]
 
-        results["variants"].append({
-            "variant": variant,
-            "images": variant_results
-        })
+    # Make sure every image is on disk before uploading or reporting
+    wait_for_saves([img for v in results["variants"] for img in v["images"]])
 
     # Step 3: Upload to Shopify if requested
-    if upload_to_shopify_product and preset.get("product_id"):
-        print(f"\n[Step 3/4] Uploading to Shopify product {preset['product_id']}...")
+    if upload_to_shopify_product and preset.product_id:
+        print(f"\n[Step 3/4] Uploading to Shopify product {preset.product_id}...")
 
         for variant_data in results["variants"]:
             for img_result in variant_data["images"]:
-                if img_result.get("filepath"):
+                if img_result.get("filepath") and not img_result.get("save_error"):
                     upload_result = upload_to_shopify(
                         img_result["filepath"],
-                        preset["product_id"],
-                        alt_text=f"{preset['name']} - {variant_data['variant'].get('name', '')}"
+                        preset.product_id,
+                        alt_text=f"{preset.name} - {variant_data['variant'].name}"
                     )
                     if upload_result["success"]:
                         print(f"    ✓ Uploaded: {img_result['filepath']}")
+                        if upload_result.get("warning"):
+                            print(f"      ⚠ {upload_result['warning']}")
                     else:
                         print(f"    ✗ Upload failed: {upload_result.get('error', 'Unknown')}")
     else:
@@ -857,6 +1706,120 @@ def generate_from_preset(
     return results
 
 
+STAGED_UPLOADS_CREATE = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+PRODUCT_CREATE_MEDIA = """
+mutation productCreateMedia($productId: ID!, $media: [CreateMediaInput!]!) {
+  productCreateMedia(productId: $productId, media: $media) {
+    media { id status }
+    mediaUserErrors { field message }
+  }
+}
+"""
+
+PRODUCT_REORDER_MEDIA = """
+mutation productReorderMedia($id: ID!, $moves: [MoveInput!]!) {
+  productReorderMedia(id: $id, moves: $moves) {
+    job { id }
+    mediaUserErrors { field message }
+  }
+}
+"""
+
+# stagedUploadsCreate returns PUT parameters by name; these are the HTTP
+# headers the storage bucket expects for each of them
+_STAGED_PUT_HEADERS = {"content_type": "Content-Type", "acl": "x-goog-acl"}
+
+
+def _shopify_graphql(shopify_store: str, access_token: str, query: str, variables: dict) -> dict:
+    """Run a Shopify Admin GraphQL operation and return its 'data', raising on errors."""
+    endpoint = f"https://{shopify_store}/admin/api/{SHOPIFY_API_VERSION}/graphql.json"
+    headers = {
+        "X-Shopify-Access-Token": access_token,
+        "Content-Type": "application/json"
+    }
+    response = _post_with_retry(endpoint, headers, _json_dumps({"query": query, "variables": variables}),
+                                timeout=60, session=_SHOPIFY_SESSION)
+    if response.status_code != 200:
+        raise RuntimeError(f"Shopify GraphQL error {response.status_code}: {response.text[:200]}")
+    body = _json_loads(response.content)
+    if body.get("errors"):
+        raise RuntimeError(f"Shopify GraphQL error: {body['errors']}")
+    return body["data"]
+
+
+def _stage_shopify_upload(image_path: str, shopify_store: str, access_token: str) -> str:
+    """Upload raw image bytes to a staged upload target and return its resource URL."""
+    path = Path(image_path)
+    mime_type = REFERENCE_MIME_TYPES.get(path.suffix.lower(), "image/png")
+
+    staged = _shopify_graphql(shopify_store, access_token, STAGED_UPLOADS_CREATE, {
+        "input": [{
+            "resource": "IMAGE",
+            "filename": path.name,
+            "mimeType": mime_type,
+            "httpMethod": "PUT",
+            "fileSize": str(path.stat().st_size)
+        }]
+    })["stagedUploadsCreate"]
+    if staged["userErrors"]:
+        raise RuntimeError(f"stagedUploadsCreate: {staged['userErrors']}")
+    target = staged["stagedTargets"][0]
+
+    # Stream the file body straight from disk - no base64, no JSON wrapping
+    put_headers = {
+        _STAGED_PUT_HEADERS.get(param["name"], param["name"]): param["value"]
+        for param in target["parameters"]
+    }
+    with open(path, "rb") as f:
+        put_response = _SHOPIFY_SESSION.put(target["url"], data=f, headers=put_headers, timeout=120)
+    if put_response.status_code not in (200, 201):
+        raise RuntimeError(f"Staged upload failed {put_response.status_code}: {put_response.text[:200]}")
+
+    return target["resourceUrl"]
+
+
+def _attach_shopify_media(resource_url: str, product_id: int, shopify_store: str,
+                          access_token: str, position: int, alt_text: str) -> dict:
+    """Attach a staged upload as product media and move it to `position` (1-based)."""
+    product_gid = f"gid://shopify/Product/{product_id}"
+    try:
+        created = _shopify_graphql(shopify_store, access_token, PRODUCT_CREATE_MEDIA, {
+            "productId": product_gid,
+            "media": [{
+                "originalSource": resource_url,
+                "alt": alt_text,
+                "mediaContentType": "IMAGE"
+            }]
+        })["productCreateMedia"]
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    if created["mediaUserErrors"]:
+        return {"success": False, "error": f"productCreateMedia: {created['mediaUserErrors']}"}
+    media_id = created["media"][0]["id"]
+
+    # productCreateMedia always appends; move the new image to where it was asked for
+    try:
+        reordered = _shopify_graphql(shopify_store, access_token, PRODUCT_REORDER_MEDIA, {
+            "id": product_gid,
+            "moves": [{"id": media_id, "newPosition": str(max(position - 1, 0))}]
+        })["productReorderMedia"]
+        if reordered["mediaUserErrors"]:
+            raise RuntimeError(f"productReorderMedia: {reordered['mediaUserErrors']}")
+    except Exception as e:
+        # The image is attached; report the ordering problem without failing the upload
+        return {"success": True, "media_id": media_id, "warning": str(e)}
+
+    return {"success": True, "media_id": media_id}
+
+
 def upload_to_shopify(
     image_path: str,
     product_id: int,
@@ -865,7 +1828,14 @@ def upload_to_shopify(
     position: int = 1,
     alt_text: str = ""
 ) -> dict:
-    """Upload a generated image to Shopify product."""
+    """Upload a generated image to Shopify product.
+
+    The file is sent as raw bytes through a staged upload, attached with
+    productCreateMedia and then moved to `position` with productReorderMedia.
+    If staging the file fails, e.g. the token lacks the required scope, it
+    falls back to the REST base64 attachment upload. Failures after staging
+    are returned as-is, so the image is never attached twice.
+    """
 
     # Get credentials from environment if not provided
     shopify_store = shopify_store or os.environ.get("SHOPIFY_STORE", "")
@@ -877,10 +1847,17 @@ def upload_to_shopify(
             "error": "Missing SHOPIFY_STORE or SHOPIFY_ACCESS_TOKEN environment variables"
         }
 
-    with open(image_path, "rb") as f:
-        image_data = base64.b64encode(f.read()).decode("utf-8")
+    try:
+        resource_url = _stage_shopify_upload(image_path, shopify_store, access_token)
+    except Exception as e:
+        print(f"    Staged upload unavailable ({e}), using attachment upload")
+    else:
+        return _attach_shopify_media(resource_url, product_id, shopify_store, access_token,
+                                     position, alt_text)
+
+    image_data = _encode_file_b64(image_path)
 
-    endpoint = f"https://{shopify_store}/admin/api/2024-01/products/{product_id}/images.json"
+    endpoint = f"https://{shopify_store}/admin/api/{SHOPIFY_API_VERSION}/products/{product_id}/images.json"
 
     payload = {
         "image": {
@@ -895,10 +1872,11 @@ def upload_to_shopify(
         "Content-Type": "application/json"
     }
 
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=60)
+    response = _post_with_retry(endpoint, headers, _json_dumps(payload), timeout=60,
+                                session=_SHOPIFY_SESSION)
 
     if response.status_code in [200, 201]:
-        result = response.json()
+        result = _json_loads(response.content)
         return {
             "success": True,
             "image_id": result["image"]["id"],
@@ -982,16 +1960,23 @@ Available Presets: mylar-bags, glass-jars
                         help="Model to use (default: gemini = Nano Banana Pro)")
     parser.add_argument("--aspect", "-a", choices=ASPECT_RATIOS, default="1:1",
                         help="Aspect ratio (default: 1:1)")
-    parser.add_argument("--preset", "-p", choices=list(PRODUCT_PRESETS.keys()),
+    parser.add_argument("--preset", "-p", choices=list(PRESETS.keys()),
                         help="Use a product preset (auto-configures everything)")
     parser.add_argument("--reference", "-r", nargs="+",
                         help="Reference image files to use for generation")
+    parser.add_argument("--downscale-refs", action="store_true",
+                        help=f"Shrink reference images to {REFERENCE_MAX_SIDE}px before upload (needs Pillow)")
     parser.add_argument("--search-competitors", action="store_true",
                         help="Search for competitor images to use as references")
     parser.add_argument("--upload", action="store_true",
                         help="Upload generated images to Shopify")
     parser.add_argument("--num-images", "-n", type=int, default=1,
                         help="Number of images per variant (default: 1)")
+    parser.add_argument("--workers", "-w", type=int, default=GENERATION_WORKERS,
+                        help=f"Concurrent generations in preset mode (default: {GENERATION_WORKERS})")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=None,
+                        help="Reuse previously generated images for identical requests "
+                             "(--no-cache also re-checks the API key with --test)")
     parser.add_argument("--test", action="store_true", help="Test API key")
     parser.add_argument("--help-setup", action="store_true", help="Show setup instructions")
     parser.add_argument("--quiet", "-q", action="store_true", help="Suppress progress messages")
@@ -1000,6 +1985,12 @@ Available Presets: mylar-bags, glass-jars
 
     args = parser.parse_args()
 
+    if args.cache:
+        if args.num_images > 1:
+            print("Note: --cache ignored with --num-images > 1 (each image must be a new generation)")
+        else:
+            CACHE_ENABLED = True
+
     if args.help_setup:
         print_setup_help()
         sys.exit(0)
@@ -1008,22 +1999,25 @@ Available Presets: mylar-bags, glass-jars
         print("\nAvailable Models:")
         print("-" * 60)
         for key, config in MODELS.items():
-            print(f"  {key:15} - {config['description']}")
+            if key in MODEL_ALIASES:
+                print(f"  {key:15} - Alias for '{MODEL_ALIASES[key]}'")
+            else:
+                print(f"  {key:15} - {config.description}")
         print()
         sys.exit(0)
 
     if args.list_presets:
         print("\nAvailable Product Presets:")
         print("-" * 60)
-        for key, config in PRODUCT_PRESETS.items():
-            print(f"  {key:15} - {config['name']}")
-            print(f"                  Product ID: {config.get('product_id', 'Not set')}")
-            print(f"                  Variants: {len(config.get('variants', []))}")
+        for key, preset in PRESETS.items():
+            print(f"  {key:15} - {preset.name}")
+            print(f"                  Product ID: {preset.product_id or 'Not set'}")
+            print(f"                  Variants: {len(preset.variants)}")
         print()
         sys.exit(0)
 
     if args.test:
-        result = test_api_key(verbose=True)
+        result = test_api_key(verbose=True, use_cache=args.cache is not False)
         sys.exit(0 if result["success"] else 1)
 
     # Preset mode - fully automated
@@ -1034,7 +2028,9 @@ Available Presets: mylar-bags, glass-jars
             upload_to_shopify_product=args.upload,
             model=args.model,
             output_dir=args.output,
-            num_images_per_variant=args.num_images
+            num_images_per_variant=args.num_images,
+            workers=args.workers,
+            downscale_refs=args.downscale_refs
         )
         sys.exit(0 if result.get("success") else 1)
 
@@ -1046,9 +2042,10 @@ Available Presets: mylar-bags, glass-jars
 
     # Load reference images if provided
     reference_images = None
+    ref_max_side = REFERENCE_MAX_SIDE if args.downscale_refs else None
     if args.reference:
         print(f"\n[Nano Banana Pro] Loading {len(args.reference)} reference images...")
-        reference_images = load_reference_images(args.reference)
+        reference_images = load_reference_images(args.reference, max_side=ref_max_side)
     elif args.search_competitors:
         print(f"\n[Nano Banana Pro] Searching for competitor reference images...")
         # Extract search terms from prompt
@@ -1058,7 +2055,7 @@ Available Presets: mylar-bags, glass-jars
             image_urls = [img["url"] for img in competitor_results if img.get("url")]
             downloaded_paths = download_reference_images(image_urls)
             if downloaded_paths:
-                reference_images = load_reference_images(downloaded_paths)
+                reference_images = load_reference_images(downloaded_paths, max_side=ref_max_side)
 
     result = generate_image(
         prompt=args.prompt,
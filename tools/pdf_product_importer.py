@@ -17,16 +17,27 @@ import sys
 import json
 import time
 import base64
+import mimetypes
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from operator import itemgetter
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from io import BytesIO
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     import fitz  # PyMuPDF
     PDF_AVAILABLE = True
+    # Malformed streams are handled (or skipped) here; keep MuPDF off stderr
+    fitz.TOOLS.mupdf_display_errors(False)
 except ImportError:
     PDF_AVAILABLE = False
     print("Error: PyMuPDF required. Install: pip install PyMuPDF")
@@ -34,19 +45,113 @@ except ImportError:
 
 try:
     from PIL import Image
+    from PIL.JpegImagePlugin import get_sampling
     PIL_AVAILABLE = True
+    # Pillow >= 9.1 moved the transpose constants into an enum
+    ROTATE_180 = getattr(Image, "Transpose", Image).ROTATE_180
 except ImportError:
     PIL_AVAILABLE = False
     print("Warning: Pillow not installed. Image rotation disabled.")
     print("Install with: pip install Pillow")
 
+# Optional: orjson serializes the PDP-sized GraphQL payloads much faster
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configuration
-SHOPIFY_STORE = os.environ.get("SHOPIFY_STORE", "oil-slick-pad.myshopify.com")
-SHOPIFY_ACCESS_TOKEN = os.environ.get("SHOPIFY_ACCESS_TOKEN", "")
-SHOPIFY_API_VERSION = "2024-01"
-SHOPIFY_BASE_URL = f"https://{SHOPIFY_STORE}/admin/api/{SHOPIFY_API_VERSION}"
+@dataclass(frozen=True, slots=True)
+class ShopifyConfig:
+    """Store settings, read from the environment once at import."""
+    store: str
+    token: str
+    api_version: str = "2024-01"
+    base_url: str = field(init=False)
+    # Sent with every Admin API call; built once instead of per request
+    json_headers: Dict[str, str] = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "base_url", f"https://{self.store}/admin/api/{self.api_version}")
+        object.__setattr__(self, "json_headers", {
+            "X-Shopify-Access-Token": self.token,
+            "Content-Type": "application/json",
+        })
+
+    @classmethod
+    def from_env(cls) -> "ShopifyConfig":
+        return cls(store=os.environ.get("SHOPIFY_STORE", "oil-slick-pad.myshopify.com"),
+                   token=os.environ.get("SHOPIFY_ACCESS_TOKEN", ""))
+
+
+CONFIG = ShopifyConfig.from_env()
+SHOPIFY_STORE = CONFIG.store
+SHOPIFY_ACCESS_TOKEN = CONFIG.token
+SHOPIFY_API_VERSION = CONFIG.api_version
+SHOPIFY_BASE_URL = CONFIG.base_url
 VENDOR_NAME = "Cloud YHS"
 
+# Re-encode settings, only used when a flipped image has to be rotated.
+# Unflipped images are written with their original PDF bytes. JPEG sources
+# keep their own tables; anything else is encoded at this quality with 4:2:0
+# chroma, which is visually the same as 95 at roughly two thirds the size.
+JPEG_QUALITY = 90
+JPEG_SUBSAMPLING = 2
+# Threads re-encoding a page's flipped images. Pillow releases the GIL while
+# encoding, so these overlap even inside a page worker process.
+ENCODE_WORKERS = 2
+
+# Images smaller than this (encoded) are icons and bullets, not product photos
+MIN_IMAGE_BYTES = 1000
+
+# Image formats Shopify accepts as uploaded files; other embedded formats
+# (JPEG 2000, JBIG2, ...) are converted to PNG on extraction
+WEB_IMAGE_EXTENSIONS = frozenset({"jpeg", "jpg", "png", "gif", "webp"})
+
+# Pages are parsed in this many worker processes (--workers). Each worker
+# opens its own copy of the PDF; 1 parses in-process.
+PDF_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Products created concurrently (--upload-workers). Calls are still paced by
+# the shared Shopify rate-limit buckets. Creation is one GraphQL call (well
+# inside the 50 points/s restore rate) plus a staged upload, so most of each
+# product's time is network latency that more workers overlap.
+UPLOAD_WORKERS = 4
+
+# Layout parsing patterns, compiled once (they run against every text span)
+# SKUs: CY/H + digits + optional letter/dash suffix, J + digits + optional
+# letters, or A/B/E/P/WS + digits (prefixes sharing a suffix rule are merged)
+SKU_RE = re.compile(r'^(?:(?:CY|H)\d+[A-Z\-]*|J\d+[A-Z]*|(?:A|B|E|P|WS)\d+)$')
+SKU_PREFIX_RE = re.compile(r'^(CY|H|B|E|WS|A|P|J)\d+')
+# First letters of every SKU prefix; anything else is rejected before the regex
+SKU_FIRST = frozenset("CHBEWAPJ")
+WEIGHT_RE = re.compile(r'^(\d+)\s*g$')
+PRICE_RE = re.compile(r'^\$?(\d+\.?\d*)$')
+STOCK_RE = re.compile(r'^(\d+)')
+
+# Catalog table columns by x position: name < 130 < SKU < 200 < (unused)
+# < 270 < weight < 320 < specs < 420 < price < 500 < stock
+COLUMN_EDGES = (130, 200, 270, 320, 420, 500)
+COL_NAME, COL_SKU, COL_GAP, COL_WEIGHT, COL_SPECS, COL_PRICE, COL_STOCK = range(7)
+# Spans starting exactly on an edge belong to no column (the bounds are strict)
+COL_EDGE = -1
+# Spans starting within this many points below a row's first span share its row
+ROW_TOLERANCE = 15
+# Table header words that show up in the name column of continuation rows
+HEADER_WORDS = frozenset({'product', 'no.', 'picture', 'weight', 'specs', 'stock'})
+# get_text("dict") flags for layout parsing: the defaults minus image blocks,
+# which would otherwise carry a copy of every image's bytes
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Title/PDP patterns: a size in inches ('7"' or "7''") and LxW[xH] in mm
+SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)[''\"]\s*")
+DIM_RE = re.compile(r'(\d+)\s*\*\s*(\d+)(?:\s*\*\s*(\d+))?')
+# A leading size (or stray quote) is dropped from the title base; the size is
+# added back in front by generate_creative_title()
+LEADING_SIZE_RE = re.compile(r"^\d+(?:\.\d+)?[''\"]+\s*")
+LEADING_QUOTE_RE = re.compile(r'^"\s*')
+
 # Trademark replacements
 TRADEMARK_REPLACEMENTS = {
     "scooby-doo": "Mystery Hound", "scooby doo": "Mystery Hound",
@@ -65,279 +170,472 @@ TRADEMARK_REPLACEMENTS = {
     "peter docter": "Emotion Guide", "sadness": "Blue Feeling",
 }
 
+# All trademarks as one alternation, longest first so "alien spider-man"
+# wins over "spider-man". Titles are lowercased before matching.
+TRADEMARK_RE = re.compile("|".join(
+    re.escape(tm) for tm in sorted(TRADEMARK_REPLACEMENTS, key=len, reverse=True)
+))
+_TRADEMARK_LOWER = {tm: replacement.lower() for tm, replacement in TRADEMARK_REPLACEMENTS.items()}
 
-def parse_pdf_with_layout(pdf_path: str) -> List[Dict]:
-    """Parse PDF using layout analysis to extract product data correctly."""
-    pdf = fitz.open(pdf_path)
-    products = []
 
-    for page_num in range(len(pdf)):
-        page = pdf[page_num]
-
-        # Get text blocks with position info
-        blocks = page.get_text("dict")["blocks"]
-
-        # Collect all text spans with positions
-        text_items = []
-        for b in blocks:
-            if "lines" in b:
-                for line in b["lines"]:
-                    for span in line["spans"]:
-                        text = span["text"].strip()
-                        if text:
-                            bbox = span["bbox"]
-                            text_items.append({
-                                "text": text,
-                                "x": bbox[0],
-                                "y": bbox[1],
-                                "y2": bbox[3]
-                            })
-
-        # Sort by y position (rows)
-        text_items.sort(key=lambda x: x["y"])
-
-        # Group into rows (items within ~15 pixels vertically are same row)
-        rows = []
-        current_row = []
-        current_y = -100
-
-        for item in text_items:
-            if abs(item["y"] - current_y) > 15:
-                if current_row:
-                    rows.append(current_row)
-                current_row = [item]
-                current_y = item["y"]
-            else:
-                current_row.append(item)
-
-        if current_row:
-            rows.append(current_row)
-
-        # Process rows to extract products
-        # Column positions (approximate):
-        # Product name: x < 130
-        # SKU: 130 < x < 200
-        # Weight: 270 < x < 320
-        # Specs: 320 < x < 420
-        # Price: 420 < x < 500
-        # Stock: x > 500
-
-        i = 0
-        while i < len(rows):
-            row = rows[i]
-
-            # Sort items in row by x position
-            row.sort(key=lambda x: x["x"])
-
-            # Look for SKU pattern in this row
-            sku = None
-            for item in row:
-                if 130 < item["x"] < 200:
-                    if re.match(r'^(CY\d+[A-Z\-]*|H\d+[A-Z\-]*|B\d+|E\d+|WS\d+|A\d+|P\d+|J\d+[A-Z]*)$', item["text"]):
-                        sku = item["text"]
-                        break
-
-            if sku:
-                # Found a product row - extract data
-                product_name_parts = []
-                weight = ""
-                specs_parts = []
-                price = 0.0
-                stock = 0
-
-                # Get data from this row
-                for item in row:
-                    x = item["x"]
-                    text = item["text"]
-
-                    if x < 130:  # Product name
-                        product_name_parts.append(text)
-                    elif 270 < x < 320:  # Weight
-                        if re.match(r'^\d+\s*g$', text):
-                            weight = text
-                    elif 320 < x < 420:  # Specs
-                        specs_parts.append(text)
-                    elif 420 < x < 500:  # Price
-                        price_match = re.match(r'^\$?(\d+\.?\d*)$', text)
-                        if price_match:
-                            price = float(price_match.group(1))
-                    elif x > 500:  # Stock
-                        stock_match = re.match(r'^(\d+)', text)
-                        if stock_match:
-                            stock = int(stock_match.group(1))
-
-                # Check next row(s) for continuation of multi-line fields
-                for j in range(i + 1, min(i + 3, len(rows))):
-                    next_row = rows[j]
-                    next_row.sort(key=lambda x: x["x"])
-
-                    # Check if this is a continuation (no SKU in typical position)
-                    has_sku = any(130 < item["x"] < 200 and
-                                  re.match(r'^(CY|H|B|E|WS|A|P|J)\d+', item["text"])
-                                  for item in next_row)
-
-                    if has_sku:
-                        break  # New product row
-
-                    for item in next_row:
-                        x = item["x"]
-                        text = item["text"]
-
-                        if x < 130:  # Product name continuation
-                            if text.lower() not in ['product', 'no.', 'picture', 'weight', 'specs', 'stock']:
-                                product_name_parts.append(text)
-                        elif 320 < x < 420:  # Specs continuation
-                            specs_parts.append(text)
-
-                # Build product
-                product_name = " ".join(product_name_parts).strip()
-                specs = " ".join(specs_parts).strip()
-
-                # Clean up product name
-                product_name = re.sub(r'\s+', ' ', product_name)
-
-                if product_name and sku and price > 0:
-                    products.append({
-                        'name': product_name,
-                        'sku': sku,
-                        'weight': weight,
-                        'specs': specs,
-                        'cost': price,
-                        'retail_price': round(price * 2, 2),
-                        'stock': stock
-                    })
-
-            i += 1
-
-    pdf.close()
-    return products
+@dataclass(slots=True)
+class Product:
+    """One product row parsed from the catalog PDF."""
+    name: str
+    sku: str
+    weight: str
+    weight_g: float  # weight parsed once, 0 when the catalog has none
+    specs: str
+    cost: float
+    retail_price: float
+    stock: int
+    # Where the SKU sits in the PDF, for matching images by position
+    page: int
+    y: float
+    image_path: Optional[str] = None
+
 
+# Document opened once per worker process by _open_worker_pdf()
+_worker_pdf = None
 
-def extract_images_from_pdf(pdf_path: str, output_folder: str, rotate: bool = True) -> List[str]:
+
+def _open_worker_pdf(pdf_path: str):
+    """Open the PDF for the page functions run in this process."""
+    global _worker_pdf
+    _worker_pdf = fitz.open(pdf_path)
+
+
+def _run_on_page(page_func, page_num: int):
+    """Load one page of the worker's PDF and pass it to page_func."""
+    return page_func(_worker_pdf[page_num])
+
+
+def _map_pages(page_func, pdf_path: str, workers: int = PDF_WORKERS):
+    """Run page_func(page) for every page of the PDF, yielding results in page order.
+
+    Pages are independent, so with workers > 1 they are spread over a process
+    pool (PyMuPDF documents can't be shared between processes). Results are
+    yielded as soon as each page is done, so callers can start on early pages.
     """
-    Extract images from PDF and save to folder in visual order (top-to-bottom).
+    global _worker_pdf
+    task = partial(_run_on_page, page_func)
+    _open_worker_pdf(pdf_path)
+    page_count = len(_worker_pdf)
+    if workers <= 1 or page_count <= 1:
+        try:
+            for page_num in range(page_count):
+                yield task(page_num)
+        finally:
+            _worker_pdf.close()
+            _worker_pdf = None
+        return
 
-    Args:
-        pdf_path: Path to PDF file
-        output_folder: Folder to save extracted images
-        rotate: If True, auto-detect and fix inverted images based on PDF transform
+    _worker_pdf.close()
+    _worker_pdf = None
+    pool = ProcessPoolExecutor(max_workers=min(workers, page_count),
+                               initializer=_open_worker_pdf, initargs=(pdf_path,))
+    try:
+        yield from pool.map(task, range(page_count))
+    finally:
+        # If the caller stops early, don't parse the pages nobody will read
+        pool.shutdown(cancel_futures=True)
 
-    Returns list of image file paths (excluding logo).
+
+def iter_catalog(pdf_path: str, output_folder: str, rotate: bool = True, workers: int = PDF_WORKERS):
+    """Parse products and extract their images in a single pass over the PDF.
+
+    Each page is loaded once and both its text layout and its images are read
+    from it. Yields (products, image paths) page by page; each product already
+    has its 'image_path' matched by position (see _match_page_images).
     """
     output_path = Path(output_folder)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    pdf = fitz.open(pdf_path)
+    image_count = 0
+    for page_products, page_images in _map_pages(partial(_process_page, rotate=rotate), pdf_path, workers):
+        image_paths = _save_page_images(page_images, output_path, image_count)
+        image_count += len(image_paths)
+        _match_page_images(page_products, [image[0] for image in page_images], image_paths)
+        yield page_products, image_paths
+
+
+def parse_and_extract(pdf_path: str, output_folder: str, rotate: bool = True,
+                      workers: int = PDF_WORKERS) -> Tuple[List[Product], List[str]]:
+    """iter_catalog() collected into (all products, all image paths)."""
+    products = []
+    image_paths = []
+    for page_products, page_image_paths in iter_catalog(pdf_path, output_folder, rotate, workers):
+        products.extend(page_products)
+        image_paths.extend(page_image_paths)
+    return products, image_paths
+
+
+def _process_page(page, rotate: bool = True) -> Tuple[List[Product], List[Tuple[float, bytes, str]]]:
+    """Products and (y, image bytes, extension) for one page."""
+    return _parse_page(page), _extract_page_images(page, rotate=rotate)
+
+
+def _match_page_images(products: List[Product], image_ys: List[float], image_paths: List[str]) -> None:
+    """Give each product the closest unused image on its page (within 200pt of its SKU).
+
+    products and image_ys/image_paths all belong to one page; image_ys is
+    sorted top to bottom.
+    """
+    used = bytearray(len(image_ys))
+    for product in products:
+        best_idx, best_distance = _nearest_unused_image(image_ys, used, product.y)
+        if best_idx is not None and best_distance < 200:
+            used[best_idx] = 1
+            product.image_path = image_paths[best_idx]
+        else:
+            product.image_path = None
+
+
+def _nearest_unused_image(image_ys: List[float], used: bytearray, y: float) -> Tuple[Optional[int], float]:
+    """Index of the unused image closest to y and its distance.
 
+    image_ys is sorted and used flags the taken indices. The search starts
+    from a bisect at y and walks outwards past used images. Ties go to the
+    lower index.
+    """
+    start = bisect_left(image_ys, y)
+
+    above = start - 1
+    while above >= 0 and used[above]:
+        above -= 1
+    if above >= 0:
+        # Among images at the same y, take the first unused one
+        k = above
+        while k > 0 and image_ys[k - 1] == image_ys[above]:
+            k -= 1
+            if not used[k]:
+                above = k
+    else:
+        above = None
+
+    below = start
+    while below < len(image_ys) and used[below]:
+        below += 1
+    if below == len(image_ys):
+        below = None
+
+    if above is None and below is None:
+        return None, float('inf')
+    if below is None or (above is not None and y - image_ys[above] <= image_ys[below] - y):
+        return above, y - image_ys[above]
+    return below, image_ys[below] - y
+
+
+def _column(x: float) -> int:
+    """Column index for a span starting at x, or COL_EDGE if x is on a column edge."""
+    col = bisect_right(COLUMN_EDGES, x)
+    if col and COLUMN_EDGES[col - 1] == x:
+        return COL_EDGE
+    return col
+
+
+def _starts_product(row: List[Tuple]) -> bool:
+    """True if a row (sorted by x) has a SKU-like value in the SKU column."""
+    for _, _, col, text in row:
+        if col > COL_SKU:
+            return False  # Past the SKU column; the rest of the row can't hold one
+        if col == COL_SKU and text[0] in SKU_FIRST and SKU_PREFIX_RE.match(text):
+            return True
+    return False
+
+
+def _parse_page(page) -> List[Product]:
+    """Extract the product rows from one page."""
+    products = []
+
+    # Get text blocks with position info
+    blocks = page.get_text("dict", flags=TEXT_FLAGS)["blocks"]
+
+    # Collect all text spans as (y, x, column, text) tuples
+    text_items = [
+        (span["bbox"][1], span["bbox"][0], _column(span["bbox"][0]), text)
+        for b in blocks if "lines" in b
+        for line in b["lines"]
+        for span in line["spans"]
+        if (text := span["text"].strip())
+    ]
+
+    # Sort by y position (rows)
+    text_items.sort()
+
+    # Group into rows (items within ~15 pixels below a row's first item are
+    # the same row). Each row is found by one binary search over the ys.
+    ys = [item[0] for item in text_items]
+    rows = []
+    start = 0
+    while start < len(ys):
+        end = bisect_right(ys, ys[start] + ROW_TOLERANCE, start)
+        rows.append(text_items[start:end])
+        start = end
+
+    # Sort items in each row by x position, once (rows are revisited as
+    # continuations of the row above)
+    by_x = itemgetter(1)
+    for row in rows:
+        row.sort(key=by_x)
+
+    # Process rows to extract products (columns: see COLUMN_EDGES)
+    i = 0
+    while i < len(rows):
+        row = rows[i]
+
+        # Look for SKU pattern in this row
+        sku = None
+        for y, _, col, text in row:
+            if col > COL_SKU:
+                break
+            if col == COL_SKU and text[0] in SKU_FIRST and SKU_RE.match(text):
+                sku = text
+                sku_y = y
+                break
+
+        if sku:
+            # Found a product row - extract data
+            product_name_parts = []
+            weight = ""
+            weight_g = 0.0
+            specs_parts = []
+            price = 0.0
+            stock = 0
+
+            # Get data from this row
+            for _, _, col, text in row:
+                if col == COL_NAME:
+                    product_name_parts.append(text)
+                elif col == COL_WEIGHT:
+                    weight_match = WEIGHT_RE.match(text)
+                    if weight_match:
+                        weight = text
+                        weight_g = float(weight_match.group(1))
+                elif col == COL_SPECS:
+                    specs_parts.append(text)
+                elif col == COL_PRICE:
+                    price_match = PRICE_RE.match(text)
+                    if price_match:
+                        price = float(price_match.group(1))
+                elif col == COL_STOCK:
+                    stock_match = STOCK_RE.match(text)
+                    if stock_match:
+                        stock = int(stock_match.group(1))
+
+            # Check next row(s) for continuation of multi-line fields
+            for j in range(i + 1, min(i + 3, len(rows))):
+                next_row = rows[j]
+
+                # Check if this is a continuation (no SKU in typical position)
+                if _starts_product(next_row):
+                    break  # New product row
+
+                for _, _, col, text in next_row:
+                    if col == COL_NAME:  # Product name continuation
+                        if text.lower() not in HEADER_WORDS:
+                            product_name_parts.append(text)
+                    elif col == COL_SPECS:  # Specs continuation
+                        specs_parts.append(text)
+
+            # Build product; split() also collapses whitespace inside spans
+            product_name = " ".join(" ".join(product_name_parts).split())
+            specs = " ".join(specs_parts).strip()
+
+            if product_name and sku and price > 0:
+                products.append(Product(
+                    name=product_name,
+                    sku=sku,
+                    weight=weight,
+                    weight_g=weight_g,
+                    specs=specs,
+                    cost=price,
+                    retail_price=round(price * 2, 2),
+                    stock=stock,
+                    page=page.number,
+                    y=sku_y
+                ))
+
+        i += 1
+
+    return products
+
+
+def _save_page_images(page_images: List[Tuple[float, bytes, str]], output_path: Path,
+                      first_index: int) -> List[str]:
+    """Write a page's images, numbered from first_index. Returns their paths."""
+    paths = []
+    for index, (_, image_bytes, ext) in enumerate(page_images, first_index):
+        image_path = output_path / f"product_{index:03d}.{ext}"
+        _write_bytes(image_path, image_bytes)
+        paths.append(str(image_path))
+    return paths
+
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    """Write data to path with plain os.write calls (no buffered file object)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _image_bytes(pdf, xref: int) -> Tuple[bytes, str]:
+    """Encoded bytes and file extension of an image xref.
+
+    JPEG streams (DCTDecode) already are the file, so they are copied out
+    raw; anything else goes through extract_image() and keeps its own format.
+    """
+    if pdf.xref_get_key(xref, "Filter") == ("name", "/DCTDecode"):
+        return pdf.xref_stream_raw(xref), "jpeg"
+    base_image = pdf.extract_image(xref)
+    if base_image["ext"] in WEB_IMAGE_EXTENSIONS:
+        return base_image["image"], base_image["ext"]
+    pix = fitz.Pixmap(pdf, xref)
+    if pix.n - pix.alpha > 3:  # CMYK can't be written as PNG
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix.tobytes("png"), "png"
+
+
+def _page_image_candidates(page) -> List[Dict]:
+    """Placed images on a page that may be product photos, in visual order.
+
+    The logo and images too small by stored size are left out without
+    reading any image data.
+    """
     # Collect all images with their visual positions
     all_images = []
 
-    for page_num in range(len(pdf)):
-        page = pdf[page_num]
-        # Get image info with xrefs and positions
-        info_list = page.get_image_info(xrefs=True)
+    # Get image info with xrefs and positions
+    info_list = page.get_image_info(xrefs=True)
 
-        for info in info_list:
-            xref = info.get('xref')
-            if not xref:
-                continue
+    for info in info_list:
+        xref = info.get('xref')
+        if not xref:
+            continue
 
-            bbox = info['bbox']
-            y_pos = bbox[1]
-            x_pos = bbox[0]
-            width = bbox[2] - bbox[0]
-
-            # Get transform matrix to detect if image is flipped
-            # Transform: (a, b, c, d, e, f) - if d is negative, image is vertically flipped
-            transform = info.get('transform', (1, 0, 0, 1, 0, 0))
-            is_flipped = transform[3] < 0 if len(transform) >= 4 else False
-
-            all_images.append({
-                'page': page_num,
-                'y': y_pos,
-                'x': x_pos,
-                'width': width,
-                'xref': xref,
-                'is_flipped': is_flipped
-            })
-
-    # Sort by visual order: page first, then y position (top to bottom)
-    all_images.sort(key=lambda img: (img['page'], img['y'], img['x']))
-
-    # Extract images in visual order
-    image_paths = []
-    image_counter = 0
+        bbox = info['bbox']
+        y_pos = bbox[1]
+        x_pos = bbox[0]
+        width = bbox[2] - bbox[0]
+
+        # Get transform matrix to detect if image is flipped
+        # Transform: (a, b, c, d, e, f) - if d is negative, image is vertically flipped
+        transform = info.get('transform', (1, 0, 0, 1, 0, 0))
+        is_flipped = transform[3] < 0 if len(transform) >= 4 else False
+
+        all_images.append({
+            'y': y_pos,
+            'x': x_pos,
+            'width': width,
+            'xref': xref,
+            'size': info.get('size', MIN_IMAGE_BYTES),
+            'is_flipped': is_flipped
+        })
+
+    # Sort by visual order: y position (top to bottom)
+    all_images.sort(key=lambda img: (img['y'], img['x']))
+
+    return [
+        img_info for img_info in all_images
+        # Skip logo (wide image at top of page 1, width > 60px on page)
+        if not (page.number == 0 and img_info['y'] < 100 and img_info['width'] > 60)
+        # Skip very small images
+        and img_info['size'] >= MIN_IMAGE_BYTES
+    ]
 
-    for img_info in all_images:
+
+def _extract_page_images(page, rotate: bool = True) -> List[Tuple[float, bytes, str]]:
+    """(y, image bytes, extension) for one page, in visual order (top-to-bottom)."""
+
+    # Extract images in visual order; flipped ones are re-encoded afterwards.
+    # An xref placed more than once is only read once.
+    images = []
+    flipped = []
+    extracted = {}
+
+    for img_info in _page_image_candidates(page):
         xref = img_info['xref']
-        width = img_info['width']
         is_flipped = img_info['is_flipped']
 
-        # Skip logo (wide image at top of page 1, width > 60px on page)
-        if img_info['page'] == 0 and img_info['y'] < 100 and width > 60:
-            continue
-
         try:
-            base_image = pdf.extract_image(xref)
-            image_bytes = base_image["image"]
-
-            # Skip very small images
-            if len(image_bytes) < 1000:
+            if xref not in extracted:
+                extracted[xref] = _image_bytes(page.parent, xref)
+            image_bytes, ext = extracted[xref]
+            if len(image_bytes) < MIN_IMAGE_BYTES:
                 continue
 
-            image_filename = f"product_{image_counter:03d}.jpeg"
-            image_path = output_path / image_filename
-
             # Rotate image 180 degrees if PDF transform indicates it's flipped
             if rotate and PIL_AVAILABLE and is_flipped:
-                try:
-                    img_pil = Image.open(BytesIO(image_bytes))
-                    img_pil = img_pil.rotate(180, expand=True)
-
-                    # Convert to RGB if needed
-                    if img_pil.mode in ('RGBA', 'P'):
-                        img_pil = img_pil.convert('RGB')
-
-                    img_pil.save(str(image_path), 'JPEG', quality=95)
-                except Exception as e:
-                    # Fall back to saving without rotation
-                    with open(image_path, 'wb') as f:
-                        f.write(image_bytes)
-            else:
-                # Save without rotation
-                with open(image_path, 'wb') as f:
-                    f.write(image_bytes)
-
-            image_paths.append(str(image_path))
-            image_counter += 1
+                flipped.append(len(images))
+
+            images.append((img_info['y'], image_bytes, ext))
 
         except Exception as e:
             pass  # Skip problematic images
 
-    pdf.close()
-    return image_paths
+    if len(flipped) > 1:
+        with ThreadPoolExecutor(max_workers=min(ENCODE_WORKERS, len(flipped))) as pool:
+            rotated = list(pool.map(_rotate_180, (images[i][1] for i in flipped)))
+    else:
+        rotated = [_rotate_180(images[i][1]) for i in flipped]
+    for i, image_bytes in zip(flipped, rotated):
+        if image_bytes is not None:
+            images[i] = (images[i][0], image_bytes, "jpeg")
+
+    return images
+
+
+def _rotate_180(image_bytes: bytes) -> Optional[bytes]:
+    """Image bytes turned 180 degrees and re-encoded as JPEG.
+
+    A JPEG source is re-encoded with its own quantization tables and chroma
+    subsampling, so the file doesn't grow. Returns None if Pillow can't
+    decode it (the image is then saved without rotation).
+    """
+    try:
+        source = Image.open(BytesIO(image_bytes))
+        # Lossless pixel reordering; rotate() would resample
+        img_pil = source.transpose(ROTATE_180)
+
+        # Convert to RGB if needed
+        if img_pil.mode in ('RGBA', 'LA', 'P'):
+            img_pil = img_pil.convert('RGB')
+
+        if source.format == 'JPEG':
+            settings = {'qtables': source.quantization, 'subsampling': get_sampling(source)}
+        else:
+            settings = {'quality': JPEG_QUALITY, 'subsampling': JPEG_SUBSAMPLING}
+        buffer = BytesIO()
+        # Progressive encoding already builds optimal Huffman tables, so a
+        # separate optimize pass would only cost time
+        img_pil.save(buffer, 'JPEG', progressive=True, **settings)
+        return buffer.getvalue()
+    except Exception as e:
+        return None
 
 
 def sanitize_title(title: str) -> str:
     """Make title trademark-safe."""
-    result = title.lower()
-    for tm, replacement in TRADEMARK_REPLACEMENTS.items():
-        if tm in result:
-            result = result.replace(tm, replacement.lower())
+    result = TRADEMARK_RE.sub(lambda m: _TRADEMARK_LOWER[m.group(0)], title.lower())
 
     words = result.split()
     small = {'a', 'an', 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with'}
     return ' '.join(w.capitalize() if i == 0 or w not in small else w for i, w in enumerate(words))
 
 
+@lru_cache(maxsize=4096)
 def generate_creative_title(name: str, sku: str, specs: str) -> str:
     """Generate creative SEO title."""
-    size_match = re.search(r"(\d+(?:\.\d+)?)[''\"]\s*", name)
+    size_match = SIZE_RE.search(name)
     size = f'{size_match.group(1)}"' if size_match else ""
 
     base = sanitize_title(name)
-    base = re.sub(r"^\d+(?:\.\d+)?[''\"]+\s*", "", base)
-    base = re.sub(r'^"\s*', "", base)
+    base = LEADING_SIZE_RE.sub("", base)
+    base = LEADING_QUOTE_RE.sub("", base)
 
     materials = []
     if specs:
@@ -357,11 +655,36 @@ def generate_creative_title(name: str, sku: str, specs: str) -> str:
     return " ".join(parts)
 
 
-def generate_tags(product: Dict) -> str:
+def generate_tags(product: Product) -> str:
     """Generate taxonomy tags."""
-    name = product['name'].lower()
-    specs = (product.get('specs') or '').lower()
-    tags = [f"vendor:{VENDOR_NAME}", f"sku:{product['sku']}"]
+    return _tags_for(product.name, product.sku, product.specs or '')
+
+
+# Keywords that drive tags, product type and category, found in one pass per
+# string. The lookahead reports every occurrence, overlapping ones included
+# ('rig' inside 'dab rig'), so membership matches a plain `in` test.
+CATEGORY_KEYWORDS_RE = re.compile(
+    "(?=(water pipe|hand pipe|nectar collector|dab tool|dab rig|rig|battery|bong|cbd"
+    "|bowl|jar|clip|glass|silicone|pvc))"
+)
+
+
+@lru_cache(maxsize=4096)
+def _scan_keywords(text: str) -> frozenset:
+    """The category keywords that occur in text (case-insensitive).
+
+    Cached, so a product's name is lowercased and scanned once for its tags,
+    type, category and features together.
+    """
+    return frozenset(CATEGORY_KEYWORDS_RE.findall(text.lower()))
+
+
+@lru_cache(maxsize=4096)
+def _tags_for(name: str, sku: str, specs: str) -> str:
+    """generate_tags() body, keyed on the product fields it reads."""
+    name = _scan_keywords(name)
+    specs = _scan_keywords(specs)
+    tags = [f"vendor:{VENDOR_NAME}", f"sku:{sku}"]
 
     if 'pvc' in specs: tags.append("material:pvc")
     if 'glass' in specs or 'glass' in name: tags.append("material:glass")
@@ -383,9 +706,10 @@ def generate_tags(product: Dict) -> str:
     return ", ".join(tags)
 
 
+@lru_cache(maxsize=4096)
 def determine_product_type(name: str) -> str:
     """Determine Shopify product type."""
-    nl = name.lower()
+    nl = _scan_keywords(name)
     if 'water pipe' in nl: return "Water Pipes"
     if 'hand pipe' in nl: return "Hand Pipes"
     if 'nectar collector' in nl: return "Nectar Collectors"
@@ -397,48 +721,8 @@ def determine_product_type(name: str) -> str:
     return "Smoke Shop Products"
 
 
-def generate_pdp(product: Dict, title: str) -> str:
-    """
-    Generate comprehensive PDP content optimized for LLM description writers.
-
-    This PDP provides all necessary details for an AI/LLM to write an excellent
-    product description following e-commerce best practices and SEO optimization.
-
-    Note: Cost/pricing info is stored in Shopify's inventory system, NOT in the PDP.
-    """
-    name = product['name']
-    sku = product['sku']
-    specs = product.get('specs', '')
-    weight = product.get('weight', '')
-
-    # === PRODUCT CLASSIFICATION ===
-    product_type = determine_product_type(name)
-    product_category = _classify_product_category(name)
-
-    # === CHARACTER/THEME ANALYSIS ===
-    character_info = _extract_character_info(name)
-
-    # === MATERIALS ANALYSIS ===
-    materials_detail = _analyze_materials(specs, name)
-
-    # === DIMENSIONS ===
-    dims_mm, dims_inches = _parse_dimensions(specs)
-    height_info = _extract_height(name)
-
-    # === COLORS ===
-    colors = _extract_colors(name, specs)
-
-    # === KEY FEATURES ===
-    features = _generate_features(name, specs, product_type)
-
-    # === USAGE & CARE ===
-    usage_info = _get_usage_info(product_type)
-
-    # === SEO KEYWORDS ===
-    seo_keywords = _generate_seo_keywords(name, product_type, materials_detail, character_info)
-
-    # === BUILD THE PDP HTML ===
-    return f"""
+# PDP HTML skeleton, filled in with str.format() by _render_pdp()
+PDP_TEMPLATE = """
 <div class="pdp-content" data-sku="{sku}">
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -460,10 +744,10 @@ def generate_pdp(product: Dict, title: str) -> str:
 ═══════════════════════════════════════════════════════════════════════════ -->
 <table style="width:100%;border-collapse:collapse;margin-bottom:20px">
 <tr style="background:#16213e;color:#eee"><th colspan="2" style="padding:12px;text-align:left;font-size:14px">🎭 CHARACTER & THEME</th></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Theme Type</td><td style="padding:10px">{character_info['theme_type']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Character Description</td><td style="padding:10px">{character_info['description']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Visual Elements</td><td style="padding:10px">{character_info['visual_elements']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Mood/Vibe</td><td style="padding:10px">{character_info['mood']}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Theme Type</td><td style="padding:10px">{character_info[theme_type]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Character Description</td><td style="padding:10px">{character_info[description]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Visual Elements</td><td style="padding:10px">{character_info[visual_elements]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Mood/Vibe</td><td style="padding:10px">{character_info[mood]}</td></tr>
 </table>
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -475,8 +759,8 @@ def generate_pdp(product: Dict, title: str) -> str:
 <tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Height</td><td style="padding:10px">{height_info}</td></tr>
 <tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Dimensions (mm)</td><td style="padding:10px">{dims_mm}</td></tr>
 <tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Dimensions (inches)</td><td style="padding:10px">{dims_inches}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Weight</td><td style="padding:10px">{weight if weight else 'Not specified'}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Colors</td><td style="padding:10px">{', '.join(colors) if colors else 'See product image'}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Weight</td><td style="padding:10px">{weight}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Colors</td><td style="padding:10px">{colors}</td></tr>
 </table>
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -485,10 +769,10 @@ def generate_pdp(product: Dict, title: str) -> str:
 ═══════════════════════════════════════════════════════════════════════════ -->
 <table style="width:100%;border-collapse:collapse;margin-bottom:20px">
 <tr style="background:#1a1a2e;color:#eee"><th colspan="2" style="padding:12px;text-align:left;font-size:14px">🔧 MATERIALS & CONSTRUCTION</th></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Primary Materials</td><td style="padding:10px">{materials_detail['primary']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Material Benefits</td><td style="padding:10px">{materials_detail['benefits']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Construction Quality</td><td style="padding:10px">{materials_detail['quality']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Raw Specs</td><td style="padding:10px"><code style="background:#e9ecef;padding:2px 6px;border-radius:3px;font-size:12px">{specs if specs else 'N/A'}</code></td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Primary Materials</td><td style="padding:10px">{materials_detail[primary]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Material Benefits</td><td style="padding:10px">{materials_detail[benefits]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Construction Quality</td><td style="padding:10px">{materials_detail[quality]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Raw Specs</td><td style="padding:10px"><code style="background:#e9ecef;padding:2px 6px;border-radius:3px;font-size:12px">{specs}</code></td></tr>
 </table>
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -499,7 +783,7 @@ def generate_pdp(product: Dict, title: str) -> str:
 <tr style="background:#16213e;color:#eee"><th colspan="2" style="padding:12px;text-align:left;font-size:14px">⭐ KEY FEATURES & SELLING POINTS</th></tr>
 <tr><td colspan="2" style="padding:15px">
 <ul style="margin:0;padding-left:20px;line-height:1.8">
-{''.join(f'<li>{f}</li>' for f in features)}
+{features}
 </ul>
 </td></tr>
 </table>
@@ -510,10 +794,10 @@ def generate_pdp(product: Dict, title: str) -> str:
 ═══════════════════════════════════════════════════════════════════════════ -->
 <table style="width:100%;border-collapse:collapse;margin-bottom:20px">
 <tr style="background:#0f3460;color:#eee"><th colspan="2" style="padding:12px;text-align:left;font-size:14px">💡 USAGE & CARE</th></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Intended Use</td><td style="padding:10px">{usage_info['use']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Experience Level</td><td style="padding:10px">{usage_info['level']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Cleaning</td><td style="padding:10px">{usage_info['cleaning']}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Care Tips</td><td style="padding:10px">{usage_info['care']}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Intended Use</td><td style="padding:10px">{usage_info[use]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Experience Level</td><td style="padding:10px">{usage_info[level]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Cleaning</td><td style="padding:10px">{usage_info[cleaning]}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Care Tips</td><td style="padding:10px">{usage_info[care]}</td></tr>
 </table>
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -522,9 +806,9 @@ def generate_pdp(product: Dict, title: str) -> str:
 ═══════════════════════════════════════════════════════════════════════════ -->
 <table style="width:100%;border-collapse:collapse;margin-bottom:20px">
 <tr style="background:#1a1a2e;color:#eee"><th colspan="2" style="padding:12px;text-align:left;font-size:14px">🔍 SEO KEYWORDS & PHRASES</th></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Primary Keywords</td><td style="padding:10px">{', '.join(seo_keywords['primary'])}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Long-tail Keywords</td><td style="padding:10px">{', '.join(seo_keywords['longtail'])}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Related Terms</td><td style="padding:10px">{', '.join(seo_keywords['related'])}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold;width:35%">Primary Keywords</td><td style="padding:10px">{seo_primary}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:10px;font-weight:bold">Long-tail Keywords</td><td style="padding:10px">{seo_longtail}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:10px;font-weight:bold">Related Terms</td><td style="padding:10px">{seo_related}</td></tr>
 </table>
 
 <!-- ═══════════════════════════════════════════════════════════════════════════
@@ -580,26 +864,89 @@ def generate_pdp(product: Dict, title: str) -> str:
 ═══════════════════════════════════════════════════════════════════════════ -->
 <table style="width:100%;border-collapse:collapse;margin-bottom:10px;opacity:0.7">
 <tr style="background:#6c757d;color:white"><th colspan="2" style="padding:10px;text-align:left;font-size:12px">📋 INTERNAL REFERENCE</th></tr>
-<tr style="border-bottom:1px solid #dee2e6"><td style="padding:8px;font-weight:bold;width:35%;font-size:12px">Vendor</td><td style="padding:8px;font-size:12px">{VENDOR_NAME}</td></tr>
-<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:8px;font-weight:bold;font-size:12px">Stock Level</td><td style="padding:8px;font-size:12px">{product.get('stock', 'N/A')} units</td></tr>
+<tr style="border-bottom:1px solid #dee2e6"><td style="padding:8px;font-weight:bold;width:35%;font-size:12px">Vendor</td><td style="padding:8px;font-size:12px">{vendor}</td></tr>
+<tr style="border-bottom:1px solid #dee2e6;background:#f8f9fa"><td style="padding:8px;font-weight:bold;font-size:12px">Stock Level</td><td style="padding:8px;font-size:12px">{stock} units</td></tr>
 </table>
 
 </div>
 """
 
 
+def generate_pdp(product: Product, title: str) -> str:
+    """
+    Generate comprehensive PDP content optimized for LLM description writers.
+
+    This PDP provides all necessary details for an AI/LLM to write an excellent
+    product description following e-commerce best practices and SEO optimization.
+
+    Note: Cost/pricing info is stored in Shopify's inventory system, NOT in the PDP.
+    """
+    return _render_pdp(product.name, product.sku, product.specs, product.weight, product.stock, title)
+
+
+@lru_cache(maxsize=4096)
+def _render_pdp(name: str, sku: str, specs: str, weight: str, stock, title: str) -> str:
+    """generate_pdp() body, keyed on the product fields it reads so repeats are free."""
+    # === PRODUCT CLASSIFICATION ===
+    product_type = determine_product_type(name)
+    product_category = _classify_product_category(name)
+
+    # === CHARACTER/THEME ANALYSIS ===
+    character_info = _extract_character_info(name)
+
+    # === MATERIALS ANALYSIS ===
+    materials_detail = _analyze_materials(specs, name)
+
+    # === DIMENSIONS ===
+    dims_mm, dims_inches = _parse_dimensions(specs)
+    height_inches = _height_inches(name)
+    height_info = _extract_height(height_inches)
+
+    # === COLORS ===
+    colors = _extract_colors(name, specs)
+
+    # === KEY FEATURES ===
+    features = _generate_features(name, specs, product_type, height_inches)
+
+    # === USAGE & CARE ===
+    usage_info = _get_usage_info(product_type)
+
+    # === SEO KEYWORDS ===
+    seo_keywords = _generate_seo_keywords(name, product_type, materials_detail, character_info)
+
+    # === BUILD THE PDP HTML ===
+    return PDP_TEMPLATE.format(
+        sku=sku, title=title, name=name, stock=stock, vendor=VENDOR_NAME,
+        product_type=product_type, product_category=product_category,
+        character_info=character_info, materials_detail=materials_detail,
+        dims_mm=dims_mm, dims_inches=dims_inches, height_info=height_info,
+        weight=weight if weight else 'Not specified',
+        specs=specs if specs else 'N/A',
+        colors=', '.join(colors) if colors else 'See product image',
+        features=''.join(f'<li>{f}</li>' for f in features),
+        usage_info=usage_info,
+        seo_primary=', '.join(seo_keywords['primary']),
+        seo_longtail=', '.join(seo_keywords['longtail']),
+        seo_related=', '.join(seo_keywords['related'])
+    )
+
+
 # === HELPER FUNCTIONS FOR PDP GENERATION ===
+# The same name or specs recur across a catalog's sizes and SKUs, where
+# _render_pdp()'s whole-product cache misses, so the helpers are cached too.
+# Cached results are shared between products: treat them as read-only.
 
+@lru_cache(maxsize=1024)
 def _classify_product_category(name: str) -> str:
     """Classify product into broader categories."""
-    nl = name.lower()
-    if any(x in nl for x in ['water pipe', 'bong']):
+    nl = _scan_keywords(name)
+    if 'water pipe' in nl or 'bong' in nl:
         return "Water Pipes & Bongs"
     elif 'hand pipe' in nl:
         return "Hand Pipes & Spoons"
     elif 'nectar collector' in nl:
         return "Nectar Collectors & Dab Straws"
-    elif any(x in nl for x in ['dab rig', 'rig']):
+    elif 'rig' in nl:
         return "Dab Rigs & Concentrates"
     elif 'bowl' in nl:
         return "Bowls & Slides"
@@ -608,57 +955,67 @@ def _classify_product_category(name: str) -> str:
     return "Smoking Accessories"
 
 
+# Character/theme mappings with descriptions; the first key (in this order)
+# found in a product name wins
+CHARACTER_THEMES = {
+    'baseball': {'theme': 'Sports/Baseball', 'desc': 'Athletic baseball player character with team uniform and cap', 'visual': 'Sports jersey, baseball cap, athletic pose', 'mood': 'Energetic, competitive, sporty'},
+    'alien': {'theme': 'Sci-Fi/Space', 'desc': 'Extraterrestrial creature with otherworldly features', 'visual': 'Futuristic design, unusual proportions, space-age aesthetic', 'mood': 'Mysterious, intriguing, out-of-this-world'},
+    'mechanical': {'theme': 'Sci-Fi/Robot', 'desc': 'Robotic mechanical being with industrial elements', 'visual': 'Metal textures, mechanical parts, industrial design', 'mood': 'Futuristic, industrial, tech-forward'},
+    'eggplant': {'theme': 'Food/Vegetable', 'desc': 'Anthropomorphic eggplant character with playful personality', 'visual': 'Purple coloring, vegetable-inspired shape, expressive features', 'mood': 'Playful, quirky, conversation-starter'},
+    'cake': {'theme': 'Food/Dessert', 'desc': 'Sweet dessert-themed character with confectionery details', 'visual': 'Pastel colors, frosting textures, sweet decorations', 'mood': 'Sweet, whimsical, delightful'},
+    'mouse': {'theme': 'Animal/Cute', 'desc': 'Adorable mouse character with charming details', 'visual': 'Big ears, cute expression, detailed outfit', 'mood': 'Cute, endearing, collectible'},
+    'cat': {'theme': 'Animal/Feline', 'desc': 'Feline character with distinctive cat features', 'visual': 'Cat ears, whiskers, elegant feline pose', 'mood': 'Sleek, mysterious, independent'},
+    'dog': {'theme': 'Animal/Canine', 'desc': 'Loyal canine companion character', 'visual': 'Dog features, friendly expression, loyal stance', 'mood': 'Friendly, loyal, approachable'},
+    'husky': {'theme': 'Animal/Dog Breed', 'desc': 'Majestic husky dog with striking features', 'visual': 'Blue eyes, thick fur texture, wolf-like appearance', 'mood': 'Majestic, wild, adventurous'},
+    'zombie': {'theme': 'Horror/Undead', 'desc': 'Undead creature with spooky zombie aesthetics', 'visual': 'Decayed textures, horror elements, undead features', 'mood': 'Spooky, edgy, Halloween-ready'},
+    'shark': {'theme': 'Ocean/Predator', 'desc': 'Fearsome shark character with oceanic theme', 'visual': 'Sharp teeth, fin details, ocean blue accents', 'mood': 'Fierce, powerful, bold'},
+    'dolphin': {'theme': 'Ocean/Marine', 'desc': 'Playful dolphin with aquatic charm', 'visual': 'Smooth curves, ocean colors, friendly appearance', 'mood': 'Playful, intelligent, aquatic'},
+    'soccer': {'theme': 'Sports/Soccer', 'desc': 'Soccer/football themed character or design', 'visual': 'Soccer ball elements, athletic wear, goal-scoring pose', 'mood': 'Competitive, global appeal, sporty'},
+    'flower': {'theme': 'Nature/Botanical', 'desc': 'Floral or plant-inspired design', 'visual': 'Petal details, natural colors, organic shapes', 'mood': 'Natural, peaceful, botanical'},
+    'skull': {'theme': 'Edgy/Gothic', 'desc': 'Skull or skeleton themed design', 'visual': 'Bone textures, dark aesthetic, detailed cranium', 'mood': 'Edgy, bold, statement piece'},
+    'octopus': {'theme': 'Ocean/Cephalopod', 'desc': 'Eight-armed sea creature with intricate details', 'visual': 'Tentacles, suction cups, deep sea colors', 'mood': 'Mysterious, intelligent, unique'},
+    'knight': {'theme': 'Fantasy/Medieval', 'desc': 'Armored warrior from medieval times', 'visual': 'Armor details, sword/shield, heroic pose', 'mood': 'Noble, brave, legendary'},
+    'witch': {'theme': 'Fantasy/Magic', 'desc': 'Magical witch character with mystical elements', 'visual': 'Pointed hat, magical accessories, mystical aura', 'mood': 'Magical, mysterious, enchanting'},
+    'mummy': {'theme': 'Horror/Egyptian', 'desc': 'Ancient wrapped figure with Egyptian mystique', 'visual': 'Bandage wrappings, ancient symbols, tomb aesthetic', 'mood': 'Ancient, mysterious, archaeological'},
+    'referee': {'theme': 'Sports/Official', 'desc': 'Sports official with authoritative presence', 'visual': 'Striped uniform, whistle, official stance', 'mood': 'Authoritative, fair, sports-themed'},
+    'penguin': {'theme': 'Animal/Arctic', 'desc': 'Adorable tuxedo-wearing arctic bird', 'visual': 'Black and white coloring, waddling pose, cute features', 'mood': 'Adorable, cool, charming'},
+    'couple': {'theme': 'Romantic/Artistic', 'desc': 'Romantic pair or artistic duo design', 'visual': 'Two figures, romantic pose, artistic styling', 'mood': 'Romantic, artistic, meaningful'},
+    'hand': {'theme': 'Mystical/Fortune', 'desc': 'Mystical hand design with fortune-telling vibes', 'visual': 'Ornate hand, mystical symbols, crystal ball elements', 'mood': 'Mystical, fortune-telling, spiritual'},
+    'light': {'theme': 'LED/Illuminated', 'desc': 'Features LED lighting for visual effect', 'visual': 'Glowing elements, color-changing lights, illuminated design', 'mood': 'Modern, eye-catching, party-ready'},
+}
+CHARACTER_RE = re.compile("(?=(" + "|".join(CHARACTER_THEMES) + "))")
+# _extract_character_info() results, built once per theme
+_CHARACTER_INFO = {
+    key: {
+        'theme_type': info['theme'],
+        'description': info['desc'],
+        'visual_elements': info['visual'],
+        'mood': info['mood']
+    }
+    for key, info in CHARACTER_THEMES.items()
+}
+# Default for unrecognized themes
+_DEFAULT_CHARACTER_INFO = {
+    'theme_type': 'Artistic/Novelty',
+    'description': 'Unique artistic design with creative character elements',
+    'visual_elements': 'Distinctive styling, artistic details, conversation piece',
+    'mood': 'Creative, unique, collectible'
+}
+
+
+@lru_cache(maxsize=1024)
 def _extract_character_info(name: str) -> Dict[str, str]:
     """Extract and describe character/theme information."""
-    nl = name.lower()
-
-    # Character mappings with descriptions
-    characters = {
-        'baseball': {'theme': 'Sports/Baseball', 'desc': 'Athletic baseball player character with team uniform and cap', 'visual': 'Sports jersey, baseball cap, athletic pose', 'mood': 'Energetic, competitive, sporty'},
-        'alien': {'theme': 'Sci-Fi/Space', 'desc': 'Extraterrestrial creature with otherworldly features', 'visual': 'Futuristic design, unusual proportions, space-age aesthetic', 'mood': 'Mysterious, intriguing, out-of-this-world'},
-        'mechanical': {'theme': 'Sci-Fi/Robot', 'desc': 'Robotic mechanical being with industrial elements', 'visual': 'Metal textures, mechanical parts, industrial design', 'mood': 'Futuristic, industrial, tech-forward'},
-        'eggplant': {'theme': 'Food/Vegetable', 'desc': 'Anthropomorphic eggplant character with playful personality', 'visual': 'Purple coloring, vegetable-inspired shape, expressive features', 'mood': 'Playful, quirky, conversation-starter'},
-        'cake': {'theme': 'Food/Dessert', 'desc': 'Sweet dessert-themed character with confectionery details', 'visual': 'Pastel colors, frosting textures, sweet decorations', 'mood': 'Sweet, whimsical, delightful'},
-        'mouse': {'theme': 'Animal/Cute', 'desc': 'Adorable mouse character with charming details', 'visual': 'Big ears, cute expression, detailed outfit', 'mood': 'Cute, endearing, collectible'},
-        'cat': {'theme': 'Animal/Feline', 'desc': 'Feline character with distinctive cat features', 'visual': 'Cat ears, whiskers, elegant feline pose', 'mood': 'Sleek, mysterious, independent'},
-        'dog': {'theme': 'Animal/Canine', 'desc': 'Loyal canine companion character', 'visual': 'Dog features, friendly expression, loyal stance', 'mood': 'Friendly, loyal, approachable'},
-        'husky': {'theme': 'Animal/Dog Breed', 'desc': 'Majestic husky dog with striking features', 'visual': 'Blue eyes, thick fur texture, wolf-like appearance', 'mood': 'Majestic, wild, adventurous'},
-        'zombie': {'theme': 'Horror/Undead', 'desc': 'Undead creature with spooky zombie aesthetics', 'visual': 'Decayed textures, horror elements, undead features', 'mood': 'Spooky, edgy, Halloween-ready'},
-        'shark': {'theme': 'Ocean/Predator', 'desc': 'Fearsome shark character with oceanic theme', 'visual': 'Sharp teeth, fin details, ocean blue accents', 'mood': 'Fierce, powerful, bold'},
-        'dolphin': {'theme': 'Ocean/Marine', 'desc': 'Playful dolphin with aquatic charm', 'visual': 'Smooth curves, ocean colors, friendly appearance', 'mood': 'Playful, intelligent, aquatic'},
-        'soccer': {'theme': 'Sports/Soccer', 'desc': 'Soccer/football themed character or design', 'visual': 'Soccer ball elements, athletic wear, goal-scoring pose', 'mood': 'Competitive, global appeal, sporty'},
-        'flower': {'theme': 'Nature/Botanical', 'desc': 'Floral or plant-inspired design', 'visual': 'Petal details, natural colors, organic shapes', 'mood': 'Natural, peaceful, botanical'},
-        'skull': {'theme': 'Edgy/Gothic', 'desc': 'Skull or skeleton themed design', 'visual': 'Bone textures, dark aesthetic, detailed cranium', 'mood': 'Edgy, bold, statement piece'},
-        'octopus': {'theme': 'Ocean/Cephalopod', 'desc': 'Eight-armed sea creature with intricate details', 'visual': 'Tentacles, suction cups, deep sea colors', 'mood': 'Mysterious, intelligent, unique'},
-        'knight': {'theme': 'Fantasy/Medieval', 'desc': 'Armored warrior from medieval times', 'visual': 'Armor details, sword/shield, heroic pose', 'mood': 'Noble, brave, legendary'},
-        'witch': {'theme': 'Fantasy/Magic', 'desc': 'Magical witch character with mystical elements', 'visual': 'Pointed hat, magical accessories, mystical aura', 'mood': 'Magical, mysterious, enchanting'},
-        'mummy': {'theme': 'Horror/Egyptian', 'desc': 'Ancient wrapped figure with Egyptian mystique', 'visual': 'Bandage wrappings, ancient symbols, tomb aesthetic', 'mood': 'Ancient, mysterious, archaeological'},
-        'referee': {'theme': 'Sports/Official', 'desc': 'Sports official with authoritative presence', 'visual': 'Striped uniform, whistle, official stance', 'mood': 'Authoritative, fair, sports-themed'},
-        'penguin': {'theme': 'Animal/Arctic', 'desc': 'Adorable tuxedo-wearing arctic bird', 'visual': 'Black and white coloring, waddling pose, cute features', 'mood': 'Adorable, cool, charming'},
-        'couple': {'theme': 'Romantic/Artistic', 'desc': 'Romantic pair or artistic duo design', 'visual': 'Two figures, romantic pose, artistic styling', 'mood': 'Romantic, artistic, meaningful'},
-        'hand': {'theme': 'Mystical/Fortune', 'desc': 'Mystical hand design with fortune-telling vibes', 'visual': 'Ornate hand, mystical symbols, crystal ball elements', 'mood': 'Mystical, fortune-telling, spiritual'},
-        'light': {'theme': 'LED/Illuminated', 'desc': 'Features LED lighting for visual effect', 'visual': 'Glowing elements, color-changing lights, illuminated design', 'mood': 'Modern, eye-catching, party-ready'},
-    }
+    found = set(CHARACTER_RE.findall(name.lower()))
 
-    # Find matching character
-    for key, info in characters.items():
-        if key in nl:
-            return {
-                'theme_type': info['theme'],
-                'description': info['desc'],
-                'visual_elements': info['visual'],
-                'mood': info['mood']
-            }
-
-    # Default for unrecognized themes
-    return {
-        'theme_type': 'Artistic/Novelty',
-        'description': 'Unique artistic design with creative character elements',
-        'visual_elements': 'Distinctive styling, artistic details, conversation piece',
-        'mood': 'Creative, unique, collectible'
-    }
+    # First matching character in table order
+    for key, info in _CHARACTER_INFO.items():
+        if key in found:
+            return info
+    return _DEFAULT_CHARACTER_INFO
 
 
+@lru_cache(maxsize=1024)
 def _analyze_materials(specs: str, name: str) -> Dict[str, str]:
     """Analyze and describe materials in detail."""
     sl = (specs + ' ' + name).lower()
@@ -703,12 +1060,13 @@ def _analyze_materials(specs: str, name: str) -> Dict[str, str]:
     }
 
 
+@lru_cache(maxsize=1024)
 def _parse_dimensions(specs: str) -> tuple:
     """Parse dimensions and convert to both mm and inches."""
     if not specs:
         return 'Not specified', 'Not specified'
 
-    m = re.search(r'(\d+)\s*\*\s*(\d+)(?:\s*\*\s*(\d+))?', specs)
+    m = DIM_RE.search(specs)
     if m:
         dims = [int(m.group(1)), int(m.group(2))]
         if m.group(3):
@@ -723,48 +1081,66 @@ def _parse_dimensions(specs: str) -> tuple:
     return 'See specifications', 'See specifications'
 
 
-def _extract_height(name: str) -> str:
-    """Extract height from product name."""
-    m = re.search(r"(\d+(?:\.\d+)?)[''\"]\s*", name)
-    if m:
-        inches = float(m.group(1))
+@lru_cache(maxsize=1024)
+def _height_inches(name: str) -> Optional[float]:
+    """Height in inches from the product name (e.g. 8" ...), or None."""
+    m = SIZE_RE.search(name)
+    return float(m.group(1)) if m else None
+
+
+@lru_cache(maxsize=1024)
+def _extract_height(inches: Optional[float]) -> str:
+    """Format the product height for the specs table."""
+    if inches is not None:
         cm = round(inches * 2.54, 1)
         return f'{inches}" ({cm} cm) tall'
     return 'See dimensions'
 
 
+# Color words found in names/specs and how they're listed, in listing order
+COLOR_NAMES = {
+    'pink': 'Pink', 'blue': 'Blue', 'green': 'Green', 'red': 'Red',
+    'purple': 'Purple', 'yellow': 'Yellow', 'orange': 'Orange',
+    'black': 'Black', 'white': 'White', 'gold': 'Gold', 'silver': 'Silver',
+    'gray': 'Gray', 'grey': 'Gray', 'brown': 'Brown', 'clear': 'Clear/Transparent'
+}
+COLOR_RE = re.compile("(?=(" + "|".join(COLOR_NAMES) + "))")
+
+
+@lru_cache(maxsize=1024)
 def _extract_colors(name: str, specs: str) -> List[str]:
     """Extract color information from name and specs."""
-    text = (name + ' ' + specs).lower()
+    found = set(COLOR_RE.findall((name + ' ' + specs).lower()))
     colors = []
 
-    color_map = {
-        'pink': 'Pink', 'blue': 'Blue', 'green': 'Green', 'red': 'Red',
-        'purple': 'Purple', 'yellow': 'Yellow', 'orange': 'Orange',
-        'black': 'Black', 'white': 'White', 'gold': 'Gold', 'silver': 'Silver',
-        'gray': 'Gray', 'grey': 'Gray', 'brown': 'Brown', 'clear': 'Clear/Transparent'
-    }
-
-    for key, value in color_map.items():
-        if key in text and value not in colors:
+    for key, value in COLOR_NAMES.items():
+        if key in found and value not in colors:
             colors.append(value)
 
     return colors if colors else []
 
 
-def _generate_features(name: str, specs: str, product_type: str) -> List[str]:
+# Feature line added for each material keyword found in the specs, in order
+MATERIAL_FEATURES = (
+    ('glass', "Borosilicate glass construction - heat-resistant and easy to clean"),
+    ('silicone', "Silicone components - virtually unbreakable for worry-free use"),
+    ('pvc', "Detailed PVC character work - intricate artistic detailing"),
+)
+
+
+@lru_cache(maxsize=1024)
+def _generate_features(name: str, specs: str, product_type: str, size: Optional[float]) -> List[str]:
     """Generate key features list based on product info."""
     features = []
     nl = name.lower()
-    sl = specs.lower() if specs else ''
+    name_keywords = _scan_keywords(name)
+    spec_keywords = _scan_keywords(specs) if specs else frozenset()
 
     # Character/theme feature
     features.append("Unique artistic character design - perfect conversation starter")
 
     # Size feature
-    m = re.search(r"(\d+(?:\.\d+)?)[''\"]\s*", name)
-    if m:
-        size = float(m.group(1))
+    if size is not None:
         if size >= 10:
             features.append(f"Impressive {size}-inch height - commanding tabletop presence")
         elif size >= 7:
@@ -773,19 +1149,14 @@ def _generate_features(name: str, specs: str, product_type: str) -> List[str]:
             features.append(f"Compact {size}-inch design - travel-friendly and discreet")
 
     # Material features
-    if 'glass' in sl:
-        features.append("Borosilicate glass construction - heat-resistant and easy to clean")
-    if 'silicone' in sl:
-        features.append("Silicone components - virtually unbreakable for worry-free use")
-    if 'pvc' in sl:
-        features.append("Detailed PVC character work - intricate artistic detailing")
+    features.extend(feature for keyword, feature in MATERIAL_FEATURES if keyword in spec_keywords)
 
     # Special features
     if 'light' in nl or 'led' in nl:
         features.append("Built-in LED lighting - stunning visual effects")
 
     # Product type specific features
-    if 'water pipe' in nl or product_type == 'Water Pipes':
+    if 'water pipe' in name_keywords or product_type == 'Water Pipes':
         features.append("Smooth water filtration for comfortable draws")
         features.append("Removable bowl for easy packing and cleaning")
 
@@ -794,6 +1165,7 @@ def _generate_features(name: str, specs: str, product_type: str) -> List[str]:
     return features
 
 
+@lru_cache(maxsize=1024)
 def _get_usage_info(product_type: str) -> Dict[str, str]:
     """Get usage and care information based on product type."""
     base_info = {
@@ -827,6 +1199,12 @@ def _get_usage_info(product_type: str) -> Dict[str, str]:
 
 def _generate_seo_keywords(name: str, product_type: str, materials: Dict, character_info: Dict) -> Dict[str, List[str]]:
     """Generate SEO keywords for the product."""
+    return _seo_keywords_for(name, product_type, materials['primary'], character_info['theme_type'])
+
+
+@lru_cache(maxsize=1024)
+def _seo_keywords_for(name: str, product_type: str, primary_materials: str, theme_type: str) -> Dict[str, List[str]]:
+    """_generate_seo_keywords() body, keyed on the fields it reads."""
     nl = name.lower()
 
     primary = [product_type.lower()]
@@ -836,14 +1214,14 @@ def _generate_seo_keywords(name: str, product_type: str, materials: Dict, charac
         primary.extend(['hand pipe', 'spoon pipe', 'glass pipe'])
 
     # Add material keywords
-    if 'glass' in materials['primary'].lower():
+    if 'glass' in primary_materials.lower():
         primary.append('glass')
-    if 'silicone' in materials['primary'].lower():
+    if 'silicone' in primary_materials.lower():
         primary.append('silicone')
 
     # Long-tail keywords
     longtail = []
-    theme = character_info['theme_type'].lower()
+    theme = theme_type.lower()
     if 'character' in theme or 'animal' in theme or 'food' in theme:
         longtail.append(f"novelty {product_type.lower()}")
         longtail.append(f"character {product_type.lower()}")
@@ -862,208 +1240,313 @@ def _generate_seo_keywords(name: str, product_type: str, materials: Dict, charac
     }
 
 
-def upload_image(product_id: int, image_path: str, alt: str) -> Dict:
-    """Upload image to Shopify."""
-    with open(image_path, 'rb') as f:
-        data = base64.b64encode(f.read()).decode()
-
-    resp = requests.post(
-        f"{SHOPIFY_BASE_URL}/products/{product_id}/images.json",
-        headers={"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN, "Content-Type": "application/json"},
-        json={"image": {"attachment": data, "position": 1, "alt": alt}},
-        timeout=60
-    )
-    return {"success": resp.status_code in [200, 201]}
+# Shopify rate limits are leaky buckets. Calls only wait once a bucket is
+# this full, then sleep until it has drained to half.
+BUCKET_HIGH_WATER = 0.8
+MAX_THROTTLE_RETRIES = 5
+
+
+class LeakyBucket:
+    """Client-side view of a Shopify leaky bucket, updated from API responses."""
+
+    def __init__(self, capacity: float, leak_rate: float):
+        self.capacity = capacity
+        self.leak_rate = leak_rate  # units drained per second
+        self.used = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, used: float, capacity: float, leak_rate: Optional[float] = None):
+        """Record the bucket state reported by the server."""
+        with self.lock:
+            self.used, self.capacity = used, capacity
+            if leak_rate:
+                self.leak_rate = leak_rate
+            self.updated = time.monotonic()
+
+    def wait(self):
+        """Sleep only if the bucket is nearly full."""
+        with self.lock:
+            used = max(0.0, self.used - (time.monotonic() - self.updated) * self.leak_rate)
+            delay = (used - self.capacity * 0.5) / self.leak_rate if used > self.capacity * BUCKET_HIGH_WATER else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+# REST: 40 calls, 2/s (X-Shopify-Shop-Api-Call-Limit). GraphQL: 1000 cost
+# points restored at 50/s (extensions.cost.throttleStatus). Plus stores
+# report larger values, which update() picks up.
+REST_BUCKET = LeakyBucket(40, 2.0)
+GRAPHQL_BUCKET = LeakyBucket(1000, 50.0)
+
+# Keep-alive connection pools for Shopify and staged-upload calls. Admin API
+# calls retry connection errors and 5xx on idempotent methods only (a
+# retried productCreate POST could duplicate a product); 429s are handled
+# by shopify_request(). Staged uploads stream a file, so they never retry.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=max(4, UPLOAD_WORKERS)))
+SESSION.mount(f"https://{CONFIG.store}/", HTTPAdapter(
+    pool_maxsize=max(4, UPLOAD_WORKERS),
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                      raise_on_status=False)
+))
+
+
+def _json_dumps(payload) -> bytes:
+    """Serialize a request payload, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+def _json_loads(content: bytes):
+    """Parse a response body, using orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def shopify_request(method: str, url: str, **kwargs) -> requests.Response:
+    """REST call that paces itself on the call-limit header and retries 429s."""
+    kwargs.setdefault("timeout", 30)
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        REST_BUCKET.wait()
+        resp = SESSION.request(method, url, headers=CONFIG.json_headers, **kwargs)
+        call_limit = resp.headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if call_limit:
+            used, capacity = call_limit.split("/")
+            REST_BUCKET.update(float(used), float(capacity))
+        if resp.status_code != 429 or attempt == MAX_THROTTLE_RETRIES:
+            return resp
+        time.sleep(float(resp.headers.get("Retry-After", 2)))
 
 
-def create_product(product: Dict, title: str, pdp: str) -> Dict:
-    """Create Shopify product."""
-    payload = {
-        "product": {
-            "title": title,
-            "body_html": pdp,
-            "vendor": VENDOR_NAME,
-            "product_type": determine_product_type(product['name']),
-            "tags": generate_tags(product),
-            "status": "draft",
-            "variants": [{
-                "price": str(product['retail_price']),
-                "sku": product['sku'],
-                "inventory_management": "shopify",
-                "inventory_quantity": product['stock'],
-                "weight": float(product['weight'].replace('g', '').strip()) if product.get('weight') and 'g' in product['weight'] else 0,
-                "weight_unit": "g"
-            }]
-        }
-    }
-
-    resp = requests.post(
-        f"{SHOPIFY_BASE_URL}/products.json",
-        headers={"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN, "Content-Type": "application/json"},
-        json=payload, timeout=30
-    )
-
-    if resp.status_code in [200, 201]:
-        result = resp.json()
-        pid = result["product"]["id"]
-        vid = result["product"]["variants"][0]["id"]
-
-        # Update cost
-        time.sleep(0.5)
-        vresp = requests.get(f"{SHOPIFY_BASE_URL}/variants/{vid}.json",
-                             headers={"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN}, timeout=30)
-        if vresp.status_code == 200:
-            iid = vresp.json()["variant"]["inventory_item_id"]
-            requests.put(f"{SHOPIFY_BASE_URL}/inventory_items/{iid}.json",
-                         headers={"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN, "Content-Type": "application/json"},
-                         json={"inventory_item": {"cost": str(product['cost'])}}, timeout=30)
-
-        return {"success": True, "product_id": pid, "title": result["product"]["title"]}
-    return {"success": False, "error": resp.text[:200]}
-
-
-def publish_product(pid: int):
-    """Publish product."""
-    requests.put(f"{SHOPIFY_BASE_URL}/products/{pid}.json",
-                 headers={"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN, "Content-Type": "application/json"},
-                 json={"product": {"id": pid, "status": "active"}}, timeout=30)
-
-
-def get_product_positions(pdf_path: str) -> List[Dict]:
-    """Get products with their page and y-position for matching."""
-    pdf = fitz.open(pdf_path)
-    products_with_pos = []
-
-    for page_num in range(len(pdf)):
-        page = pdf[page_num]
-        blocks = page.get_text("dict")["blocks"]
-
-        text_items = []
-        for b in blocks:
-            if "lines" in b:
-                for line in b["lines"]:
-                    for span in line["spans"]:
-                        text = span["text"].strip()
-                        if text:
-                            bbox = span["bbox"]
-                            text_items.append({
-                                "text": text,
-                                "x": bbox[0],
-                                "y": bbox[1],
-                            })
-
-        # Find SKUs with positions
-        for item in text_items:
-            if 130 < item["x"] < 200:
-                if re.match(r'^(CY\d+[A-Z\-]*|H\d+[A-Z\-]*|B\d+|E\d+|WS\d+|A\d+|P\d+|J\d+[A-Z]*)$', item["text"]):
-                    products_with_pos.append({
-                        'sku': item["text"],
-                        'page': page_num,
-                        'y': item["y"]
-                    })
-
-    pdf.close()
-
-    # Remove duplicate SKUs (keep first occurrence)
-    seen = set()
-    unique = []
-    for p in products_with_pos:
-        if p['sku'] not in seen:
-            seen.add(p['sku'])
-            unique.append(p)
-
-    return unique
-
-
-def match_images_to_products(pdf_path: str, products: List[Dict], image_paths: List[str], rotate: bool = True) -> None:
-    """
-    Match images to products based on page and y-position proximity.
+def upload_image(product_id: int, image_path: str, alt: str) -> Dict:
+    """Upload image to Shopify.
 
-    This handles cases where there are extra images without corresponding products
-    by matching each product to the closest image on the same page.
+    The file is streamed to a staged upload target and attached with
+    productCreateMedia. The base64 REST upload is only the fallback when
+    staging fails; once productCreateMedia has been sent its errors are
+    returned, since Shopify may already have attached the image.
     """
-    pdf = fitz.open(pdf_path)
-
-    # Collect all images with their page and position info
-    all_images = []
-    for page_num in range(len(pdf)):
-        page = pdf[page_num]
-        info_list = page.get_image_info(xrefs=True)
-
-        for info in info_list:
-            xref = info.get('xref')
-            if not xref:
-                continue
-
-            bbox = info['bbox']
-            y_pos = bbox[1]
-            width = bbox[2] - bbox[0]
+    try:
+        resource_url = stage_image(image_path)
+    except Exception:
+        pass
+    else:
+        try:
+            created = shopify_graphql(PRODUCT_CREATE_MEDIA, {
+                "productId": f"gid://shopify/Product/{product_id}",
+                "media": [{"originalSource": resource_url, "alt": alt, "mediaContentType": "IMAGE"}]
+            })["productCreateMedia"]
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        if created["mediaUserErrors"]:
+            return {"success": False, "error": f"productCreateMedia: {created['mediaUserErrors']}"}
+        return {"success": True}
+
+    # base64 output never needs JSON escaping, so the body is assembled as
+    # bytes around it instead of pushing a multi-MB str through json.dumps
+    body = b"".join((
+        b'{"image": {"attachment": "', base64.b64encode(Path(image_path).read_bytes()),
+        b'", "position": 1, "alt": ', _json_dumps(alt), b'}}'
+    ))
+    resp = shopify_request(
+        "POST", f"{CONFIG.base_url}/products/{product_id}/images.json",
+        data=body, timeout=60
+    )
+    return {"success": resp.status_code in [200, 201]}
 
-            # Skip logo
-            if page_num == 0 and y_pos < 100 and width > 60:
-                continue
 
-            # Check image size
-            try:
-                base_image = pdf.extract_image(xref)
-                if len(base_image["image"]) < 1000:
-                    continue
-            except:
-                continue
+PRODUCT_CREATE = """
+mutation productCreate($input: ProductInput!, $media: [CreateMediaInput!]) {
+  productCreate(input: $input, media: $media) {
+    product { id title }
+    userErrors { field message }
+  }
+}
+"""
 
-            all_images.append({
-                'page': page_num,
-                'y': y_pos,
-                'xref': xref
-            })
+PRODUCT_CREATE_MEDIA = """
+mutation productCreateMedia($productId: ID!, $media: [CreateMediaInput!]!) {
+  productCreateMedia(productId: $productId, media: $media) {
+    media { id }
+    mediaUserErrors { field message }
+  }
+}
+"""
 
-    pdf.close()
+STAGED_UPLOADS_CREATE = """
+mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
 
-    # Sort images by page then y position
-    all_images.sort(key=lambda img: (img['page'], img['y']))
+# stagedUploadsCreate returns PUT parameters by name; these are the HTTP
+# headers the storage bucket expects for each of them
+_STAGED_PUT_HEADERS = {"content_type": "Content-Type", "acl": "x-goog-acl"}
 
-    # Get product positions
-    product_positions = get_product_positions(pdf_path)
+# Stock is set at the shop's primary location, looked up once per run
+_location_id = None
 
-    # Create a mapping from SKU to product index
-    sku_to_idx = {p['sku']: i for i, p in enumerate(products)}
 
-    # Match each product to the closest image on the same page
-    used_image_indices = set()
+def shopify_graphql(query: str, variables: Optional[Dict] = None) -> Dict:
+    """Run an Admin GraphQL operation and return its 'data', raising on errors.
 
-    for prod_pos in product_positions:
-        sku = prod_pos['sku']
-        prod_page = prod_pos['page']
-        prod_y = prod_pos['y']
+    Paces itself on the query cost budget and retries THROTTLED responses.
+    """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        GRAPHQL_BUCKET.wait()
+        resp = shopify_request("POST", f"{CONFIG.base_url}/graphql.json",
+                               data=_json_dumps({"query": query, "variables": variables or {}}), timeout=60)
+        if resp.status_code != 200:
+            raise RuntimeError(f"GraphQL error {resp.status_code}: {resp.text[:200]}")
+        body = _json_loads(resp.content)
+
+        throttle = body.get("extensions", {}).get("cost", {}).get("throttleStatus")
+        if throttle:
+            GRAPHQL_BUCKET.update(throttle["maximumAvailable"] - throttle["currentlyAvailable"],
+                                  throttle["maximumAvailable"], throttle["restoreRate"])
+
+        errors = body.get("errors")
+        throttled = errors and any(e.get("extensions", {}).get("code") == "THROTTLED" for e in errors)
+        if throttled and attempt < MAX_THROTTLE_RETRIES:
+            continue  # wait() sleeps until the budget has refilled
+        if errors:
+            raise RuntimeError(f"GraphQL error: {errors}")
+        return body["data"]
+
+
+def _primary_location_id() -> Optional[str]:
+    """GID of the shop's primary location (None if it can't be read)."""
+    global _location_id
+    if _location_id is None:
+        try:
+            _location_id = shopify_graphql("{ location { id } }")["location"]["id"]
+        except Exception as e:
+            print(f"  Warning: could not read primary location, stock not set: {e}")
+            _location_id = ""
+    return _location_id or None
+
+
+def stage_image(image_path: str) -> str:
+    """Upload an image file to a Shopify staged target. Returns its resourceUrl."""
+    path = Path(image_path)
+    staged = shopify_graphql(STAGED_UPLOADS_CREATE, {
+        "input": [{
+            "resource": "IMAGE",
+            "filename": path.name,
+            "mimeType": mimetypes.guess_type(path.name)[0] or "image/jpeg",
+            "httpMethod": "PUT",
+            "fileSize": str(path.stat().st_size)
+        }]
+    })["stagedUploadsCreate"]
+    if staged["userErrors"]:
+        raise RuntimeError(f"stagedUploadsCreate: {staged['userErrors']}")
+    target = staged["stagedTargets"][0]
+
+    headers = {_STAGED_PUT_HEADERS.get(param["name"], param["name"]): param["value"]
+               for param in target["parameters"]}
+    with open(path, 'rb') as f:
+        resp = SESSION.put(target["url"], data=f, headers=headers, timeout=120)
+    if resp.status_code not in (200, 201):
+        raise RuntimeError(f"Staged upload failed {resp.status_code}: {resp.text[:200]}")
+    return target["resourceUrl"]
+
+
+def create_product(product: Product, title: str, pdp: str, image_path: Optional[str] = None,
+                   publish: bool = False) -> Dict:
+    """Create Shopify product, with cost, stock and image, in one GraphQL call.
+
+    The image is attached when it could be staged ('image_uploaded' in the
+    result); otherwise the product is created without it. With publish, the
+    product is created active unless its image still has to be uploaded
+    ('published' in the result).
+    """
+    variant = {
+        "price": f"{product.retail_price:.2f}",
+        "sku": product.sku,
+        "inventoryItem": {"cost": f"{product.cost:.2f}", "tracked": True},
+        "weight": product.weight_g,
+        "weightUnit": "GRAMS"
+    }
+    location_id = _primary_location_id()
+    if location_id:
+        variant["inventoryQuantities"] = [{"availableQuantity": product.stock, "locationId": location_id}]
 
-        if sku not in sku_to_idx:
-            continue
+    media = []
+    if image_path:
+        try:
+            media.append({"originalSource": stage_image(image_path), "alt": title, "mediaContentType": "IMAGE"})
+        except Exception as e:
+            print(f"  Warning: image staging failed: {e}")
+
+    # Don't go live without the image; import_product() publishes after the fallback upload
+    active = publish and (bool(media) or not image_path)
+    try:
+        created = shopify_graphql(PRODUCT_CREATE, {
+            "input": {
+                "title": title,
+                "descriptionHtml": pdp,
+                "vendor": VENDOR_NAME,
+                "productType": determine_product_type(product.name),
+                "tags": generate_tags(product).split(", "),
+                "status": "ACTIVE" if active else "DRAFT",
+                "variants": [variant]
+            },
+            "media": media or None
+        })["productCreate"]
+    except Exception as e:
+        return {"success": False, "error": str(e)[:200]}
+
+    if created["userErrors"] or not created["product"]:
+        return {"success": False, "error": str(created["userErrors"])[:200]}
+
+    pid = int(created["product"]["id"].rsplit("/", 1)[1])
+    return {"success": True, "product_id": pid, "title": created["product"]["title"],
+            "image_uploaded": bool(media), "published": active}
 
-        prod_idx = sku_to_idx[sku]
 
-        # Find the closest unused image on the same page
-        best_img_idx = None
-        best_distance = float('inf')
+def publish_product(pid: int):
+    """Publish product."""
+    shopify_request("PUT", f"{CONFIG.base_url}/products/{pid}.json",
+                    data=_json_dumps({"product": {"id": pid, "status": "active"}}))
+
+
+def import_product(p: Product, publish: bool = False) -> Tuple[bool, List[str]]:
+    """Create one product with its image (and publish it). Returns (success, log lines)."""
+    log = []
+    title = generate_creative_title(p.name, p.sku, p.specs)
+    pdp = generate_pdp(p, title)
+
+    image_path = p.image_path if p.image_path and os.path.exists(p.image_path) else None
+    result = create_product(p, title, pdp, image_path=image_path, publish=publish)
+    if not result['success']:
+        log.append(f"  FAILED: {result.get('error', 'Unknown')}")
+        return False, log
+
+    pid = result['product_id']
+    log.append(f"  Created: {pid}")
+
+    if result['image_uploaded']:
+        log.append(f"  Image uploaded")
+    elif image_path:
+        # Staging failed at creation; upload_image() retries it, then falls back to base64
+        upload = upload_image(pid, image_path, title)
+        if upload['success']:
+            log.append(f"  Image uploaded")
+        else:
+            log.append(f"  Image upload failed: {upload.get('error', 'Unknown')}")
 
-        for img_idx, img in enumerate(all_images):
-            if img_idx in used_image_indices:
-                continue
-            if img['page'] != prod_page:
-                continue
+    if publish:
+        if not result['published']:
+            publish_product(pid)
+        log.append(f"  Published")
 
-            distance = abs(img['y'] - prod_y)
-            if distance < best_distance:
-                best_distance = distance
-                best_img_idx = img_idx
-
-        # Assign image if found (within reasonable distance)
-        if best_img_idx is not None and best_distance < 200:
-            used_image_indices.add(best_img_idx)
-            # Map the image index to the image path
-            if best_img_idx < len(image_paths):
-                products[prod_idx]['image_path'] = image_paths[best_img_idx]
-        else:
-            products[prod_idx]['image_path'] = None
+    return True, log
 
 
 def main():
@@ -1080,32 +1563,40 @@ def main():
                         help="Rotate images 180° (default: enabled)")
     parser.add_argument("--no-rotate", dest="rotate", action="store_false",
                         help="Disable image rotation")
+    parser.add_argument("--workers", "-w", type=int, default=PDF_WORKERS,
+                        help=f"Processes used to parse PDF pages (default: {PDF_WORKERS})")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS,
+                        help=f"Products created concurrently (default: {UPLOAD_WORKERS})")
     args = parser.parse_args()
 
     print(f"\n{'='*60}\nPDF PRODUCT IMPORTER\n{'='*60}")
 
-    # Parse products
-    print(f"\nParsing: {args.file}")
-    products = parse_pdf_with_layout(args.file)
-    print(f"Found {len(products)} products")
-
-    # Extract images (sorted by visual position, logo excluded)
+    # Parse products and extract images (sorted by visual position, logo
+    # excluded) in one pass over the PDF. Images are matched to products by
+    # position on each page, which handles extra images without a product.
     img_folder = "pdf_extracted_images"
     rotate_msg = "(with auto-rotation)" if args.rotate else "(no rotation)"
+    print(f"\nParsing: {args.file}")
     print(f"Extracting images {rotate_msg}...")
-    images = extract_images_from_pdf(args.file, img_folder, rotate=args.rotate)
-    print(f"Extracted {len(images)} product images")
+    pages = iter_catalog(args.file, img_folder, rotate=args.rotate, workers=args.workers)
 
-    # Match images to products using position-based matching
-    # This handles extra images that don't correspond to any product
-    print("Matching images to products by position...")
-    match_images_to_products(args.file, products, images, rotate=args.rotate)
+    if args.execute and not args.dry_run and not args.list:
+        create_products(pages, args)
+        return
+
+    products = []
+    image_count = 0
+    for page_products, page_image_paths in pages:
+        products.extend(page_products)
+        image_count += len(page_image_paths)
+    print(f"Found {len(products)} products")
+    print(f"Extracted {image_count} product images")
 
     if args.list:
         print(f"\n{'='*60}\nPRODUCTS\n{'='*60}")
         for i, p in enumerate(products):
-            img = "IMG" if p.get('image_path') else "   "
-            print(f"{i+1:3}. [{img}] {p['sku']:10} ${p['retail_price']:7.2f} | {p['name'][:45]}")
+            img = "IMG" if p.image_path else "   "
+            print(f"{i+1:3}. [{img}] {p.sku:10} ${p.retail_price:7.2f} | {p.name[:45]}")
         return
 
     # Select range
@@ -1113,51 +1604,52 @@ def main():
     selected = products[args.start:end]
     print(f"\nProcessing {len(selected)} products ({args.start+1} to {min(end, len(products))})")
 
-    if args.dry_run or not args.execute:
-        print(f"\n{'='*60}\nDRY RUN\n{'='*60}")
-        for i, p in enumerate(selected):
-            title = generate_creative_title(p['name'], p['sku'], p.get('specs', ''))
-            img = "Yes" if p.get('image_path') else "No"
-            print(f"\n[{i+1}] {p['sku']}")
-            print(f"  Name: {p['name']}")
-            print(f"  Title: {title}")
-            print(f"  Cost: ${p['cost']:.2f} → Retail: ${p['retail_price']:.2f}")
-            print(f"  Image: {img}")
-        print(f"\n{'='*60}\nRun with --execute to create\n{'='*60}")
-        return
+    print(f"\n{'='*60}\nDRY RUN\n{'='*60}")
+    for i, p in enumerate(selected):
+        title = generate_creative_title(p.name, p.sku, p.specs)
+        img = "Yes" if p.image_path else "No"
+        print(f"\n[{i+1}] {p.sku}")
+        print(f"  Name: {p.name}")
+        print(f"  Title: {title}")
+        print(f"  Cost: ${p.cost:.2f} → Retail: ${p.retail_price:.2f}")
+        print(f"  Image: {img}")
+    print(f"\n{'='*60}\nRun with --execute to create\n{'='*60}")
+
 
-    if not SHOPIFY_ACCESS_TOKEN:
+def create_products(pages, args) -> None:
+    """Create the selected products while the rest of the PDF is still being parsed.
+
+    Products are handed to the upload pool as each page comes out of
+    iter_catalog(), and parsing stops once the --start/--count range is covered.
+    """
+    if not CONFIG.token:
         print("ERROR: SHOPIFY_ACCESS_TOKEN not set")
         sys.exit(1)
 
     print(f"\n{'='*60}\nCREATING PRODUCTS\n{'='*60}")
     results = {"success": 0, "failed": 0}
-
-    for i, p in enumerate(selected):
-        print(f"\n[{i+1}/{len(selected)}] {p['sku']}: {p['name'][:40]}")
-
-        title = generate_creative_title(p['name'], p['sku'], p.get('specs', ''))
-        pdp = generate_pdp(p, title)
-
-        result = create_product(p, title, pdp)
-        if result['success']:
-            pid = result['product_id']
-            print(f"  Created: {pid}")
-
-            if p.get('image_path') and os.path.exists(p['image_path']):
-                if upload_image(pid, p['image_path'], title)['success']:
-                    print(f"  Image uploaded")
-
-            if args.publish:
-                publish_product(pid)
-                print(f"  Published")
-
-            results['success'] += 1
-        else:
-            print(f"  FAILED: {result.get('error', 'Unknown')}")
-            results['failed'] += 1
-
-        time.sleep(1)
+    end = args.start + args.count if args.count else None
+
+    _primary_location_id()  # Look it up once before the workers need it
+    with ThreadPoolExecutor(max_workers=max(1, args.upload_workers)) as pool:
+        submitted = []
+        index = 0
+        for page_products, _ in pages:
+            for p in page_products:
+                if index >= args.start and (end is None or index < end):
+                    submitted.append((p, pool.submit(import_product, p, publish=args.publish)))
+                index += 1
+            if end is not None and index >= end:
+                break
+        pages.close()  # Stop parsing pages past the selected range
+
+        # Report in catalog order as each product finishes
+        for i, (p, future) in enumerate(submitted):
+            success, log = future.result()
+            print(f"\n[{i+1}/{len(submitted)}] {p.sku}: {p.name[:40]}")
+            for line in log:
+                print(line)
+            results['success' if success else 'failed'] += 1
 
     print(f"\n{'='*60}\nDONE: {results['success']} created, {results['failed']} failed\n{'='*60}")
 